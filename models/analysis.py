@@ -1,47 +1,311 @@
+import csv
+import os
 import re
-from collections import Counter
-import pandas as pd
+import statistics
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-def analyze_transcript(text: str):
-    text = text.lower()
-    words = re.findall(r"\b\w+\b", text)
-    total_words = len(words)
-    unique_words = len(set(words))
-    ttr = unique_words / total_words if total_words else 0
-
-    sentences = re.split(r"[.!?]+", text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    avg_sentence_length = sum(len(re.findall(r"\b\w+\b", s)) for s in sentences) / len(sentences) if sentences else 0
+# меняйте при изменении правил подсчёта: от версии зависит кэш результатов анализа
+ANALYSIS_VERSION = 2
 
-    word_counts = Counter(words)
-    most_common = word_counts.most_common(10)
+# слово или конец предложения; всё остальное непробельное — «содержимое» предложения
+_TOKEN_RE = re.compile(r"(\w+)|([.!?]+)|\S")
+_WORD_RE = re.compile(r"\w+")
 
-    filler_words = {
+FILLER_LEXICONS = {
+    "ru": (
         "ну", "как бы", "короче", "в общем", "по сути", "на самом деле",
         "вроде бы", "это самое", "типа", "значит", "получается",
         "вот", "эээ", "ммм", "как это", "то есть", "скажем", "вот это",
         "так сказать", "в общем-то", "вообще", "получается так",
         "ещё бы", "такой", "так", "просто", "реально", "типа того",
         "всё такое", "ну да", "ну вот", "ну типа", "и всё такое"
-    }
+    ),
+}
+
+
+class FillerMatcher:
+    """
+    Префиксное дерево фраз-паразитов по словам.
+
+    За один проход по потоку слов находит самую длинную фразу, начинающуюся
+    с текущего слова («ну вот» считается одной фразой, а не «ну» + «вот»),
+    и перескакивает через неё.
+    """
+
+    _END = object()
+
+    def __init__(self, phrases):
+        self.root = {}
+        self.depth = 0
+        for phrase in phrases:
+            tokens = _WORD_RE.findall(phrase.lower())
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[self._END] = phrase
+            self.depth = max(self.depth, len(tokens))
+
+    def count(self, words):
+        """
+        :param words: список слов в нижнем регистре
+        :return: {фраза: число вхождений}
+        """
+        counts = Counter()
+        i, n = 0, len(words)
+        while i < n:
+            node, match, length = self.root, None, 0
+            for j in range(i, min(n, i + self.depth)):
+                node = node.get(words[j])
+                if node is None:
+                    break
+                if self._END in node:
+                    match, length = node[self._END], j - i + 1
+            if match is None:
+                i += 1
+            else:
+                counts[match] += 1
+                i += length
+        return dict(counts)
+
+
+_MATCHERS = {}
+
+
+def register_filler_lexicon(lang: str, phrases):
+    """
+    Добавляет (или заменяет) словарь слов-паразитов для языка.
 
-    filler_counts = {word: count for word, count in word_counts.items() if word in filler_words}
+    :param phrases: слова и фразы из нескольких слов
+    """
+    FILLER_LEXICONS[lang] = tuple(phrases)
+    _MATCHERS[lang] = FillerMatcher(FILLER_LEXICONS[lang])
+
+
+for _lang in list(FILLER_LEXICONS):
+    register_filler_lexicon(_lang, FILLER_LEXICONS[_lang])
+
+
+def _tokenize(text: str):
+    """
+    Один проход по тексту: слова и границы предложений.
+
+    :return: (список слов в нижнем регистре, число непустых предложений)
+    """
+    words = []
+    sentence_count = 0
+    in_sentence = False
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word, terminator = match.group(1), match.group(2)
+        if terminator:
+            sentence_count += in_sentence
+            in_sentence = False
+        else:
+            in_sentence = True
+            if word:
+                words.append(word)
+    sentence_count += in_sentence
+    return words, sentence_count
+
+
+def _analyze(text: str, lang: str):
+    """:return: (отчёт analyze_transcript, Counter всех слов текста)"""
+    if lang not in _MATCHERS:
+        raise ValueError(f"Нет словаря слов-паразитов для языка {lang}")
+
+    words, sentence_count = _tokenize(text)
+    total_words = len(words)
+    word_counts = Counter(words)
+    unique_words = len(word_counts)
+    # 0.0, а не 0: столбцы таблицы analyze_corpus (Parquet) должны быть float во всех строках
+    ttr = unique_words / total_words if total_words else 0.0
+    avg_sentence_length = total_words / sentence_count if sentence_count else 0.0
+
+    most_common = word_counts.most_common(10)
+
+    filler_counts = _MATCHERS[lang].count(words)
 
     metrics = {
         "Общее количество слов": total_words,
         "Уникальных слов": unique_words,
         "Type-Token Ratio (TTR)": round(ttr, 2),
         "Средняя длина предложения": round(avg_sentence_length, 2),
-        "Количество предложений": len(sentences),
+        "Количество предложений": sentence_count,
         "Количество слов-паразитов": sum(filler_counts.values()),
         "Уникальных слов-паразитов": len(filler_counts)
     }
 
-    return {
+    report = {
         "metrics": metrics,
         "filler_counts": filler_counts,
         "most_common": most_common
     }
+    return report, word_counts
+
+
+def analyze_transcript(text: str, lang: str = "ru"):
+    """
+    :param lang: язык словаря слов-паразитов (см. FILLER_LEXICONS)
+    """
+    return _analyze(text, lang)[0]
+
+
+def _init_corpus_worker(lexicons):
+    # словари, добавленные через register_filler_lexicon, при spawn нужно передать заново
+    for lang, phrases in lexicons.items():
+        if FILLER_LEXICONS.get(lang) != phrases:
+            register_filler_lexicon(lang, phrases)
+
+
+def _analyze_chunk(chunk, lang):
+    """
+    Анализирует пачку текстов в процессе-воркере. Файлы читаются здесь же,
+    чтобы тексты не пересылались между процессами.
+
+    :param chunk: список пар (имя, Path или текст)
+    :return: (строки таблицы, Counter слов, Counter слов-паразитов)
+    """
+    rows, vocabulary, fillers = [], Counter(), Counter()
+    for name, item in chunk:
+        text = item.read_text(encoding="utf-8") if isinstance(item, Path) else item
+        report, word_counts = _analyze(text, lang)
+        rows.append({"Файл": name, **report["metrics"]})
+        vocabulary.update(word_counts)
+        fillers.update(report["filler_counts"])
+    return rows, vocabulary, fillers
+
+
+def _chunks(items, size):
+    # str — всегда текст, путь к файлу передаётся как Path или другой os.PathLike
+    chunk = []
+    for i, item in enumerate(items):
+        if isinstance(item, os.PathLike):
+            item = Path(item)
+            chunk.append((item.name, item))
+        else:
+            chunk.append((f"text_{i}", item))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _TableWriter:
+    """Построчная запись метрик в CSV или Parquet (по расширению файла)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._parquet = self.path.suffix == ".parquet"
+        self._writer = None
+        self._file = None
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pylist(rows)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(str(self.path), table.schema)
+            self._writer.write_table(table)
+        else:
+            if self._writer is None:
+                self._file = open(self.path, "w", encoding="utf-8", newline="")
+                self._writer = csv.DictWriter(self._file, fieldnames=list(rows[0]))
+                self._writer.writeheader()
+            self._writer.writerows(rows)
+
+    def close(self):
+        if self._parquet and self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _ttr_distribution(values):
+    if not values:
+        return {}
+    distribution = {
+        "mean": statistics.fmean(values),
+        "median": statistics.median(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": min(values),
+        "max": max(values),
+    }
+    if len(values) > 1:
+        distribution["quartiles"] = statistics.quantiles(values, n=4)
+    return {k: [round(q, 4) for q in v] if isinstance(v, list) else round(v, 4) for k, v in distribution.items()}
+
+
+def analyze_corpus(items, output_path=None, workers=None, lang: str = "ru", chunk_size=64):
+    """
+    Анализирует корпус расшифровок в нескольких процессах.
+
+    Метрики каждого текста пишутся в таблицу по мере готовности; в памяти
+    держатся только общий словарь и значения TTR, а не сами тексты.
+
+    :param items: итерируемое путей (Path или os.PathLike; файлы читаются в воркерах) или строк
+        с текстом; строка всегда считается текстом, а не путём — пути оборачивайте в Path
+    :param output_path: таблица метрик по текстам, .csv или .parquet (нужен pyarrow); None — не сохранять
+    :param workers: число процессов (None — по числу ядер, 1 — в текущем процессе)
+    :param chunk_size: число текстов в одной задаче воркера
+    :return: словарь с метриками корпуса
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = _TableWriter(output_path) if output_path is not None else None
+    vocabulary, fillers = Counter(), Counter()
+    ttrs = []
+    documents = total_words = 0
+
+    def merge(result):
+        nonlocal documents, total_words
+        rows, chunk_vocabulary, chunk_fillers = result
+        if writer is not None:
+            writer.write(rows)
+        vocabulary.update(chunk_vocabulary)
+        fillers.update(chunk_fillers)
+        for row in rows:
+            documents += 1
+            total_words += row["Общее количество слов"]
+            if row["Общее количество слов"]:
+                ttrs.append(row["Уникальных слов"] / row["Общее количество слов"])
+
+    try:
+        if workers <= 1:
+            for chunk in _chunks(items, chunk_size):
+                merge(_analyze_chunk(chunk, lang))
+        else:
+            lexicons = dict(FILLER_LEXICONS)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_corpus_worker,
+                                     initargs=(lexicons,)) as pool:
+                # ограничиваем число задач в полёте, чтобы не держать весь корпус в очереди
+                in_flight = deque()
+                for chunk in _chunks(items, chunk_size):
+                    in_flight.append(pool.submit(_analyze_chunk, chunk, lang))
+                    if len(in_flight) >= workers * 2:
+                        merge(in_flight.popleft().result())
+                while in_flight:
+                    merge(in_flight.popleft().result())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        "Текстов": documents,
+        "Общее количество слов": total_words,
+        "Размер словаря": len(vocabulary),
+        "Type-Token Ratio (корпус)": round(len(vocabulary) / total_words, 4) if total_words else 0,
+        "Распределение TTR": _ttr_distribution(ttrs),
+        "filler_counts": dict(fillers.most_common()),
+        "most_common": vocabulary.most_common(10),
+    }
+
 
 def save_report(report_data: dict, path: str):
     with open(path, "w", encoding="utf-8") as f:
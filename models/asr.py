@@ -1,18 +1,208 @@
 # models/asr.py
 
-import whisper
+import dataclasses
 
-def transcribe_audio(audio_path: str, model_size: str = "medium") -> str:
+import numpy as np
+import torch
+
+from models.registry import get_whisper
+from models.resample import resample
+from models.tracing import span
+
+WHISPER_SR = 16000
+WINDOW_SEC = 30.0  # Whisper всегда видит 30-секундное окно
+TIME_PRECISION = 0.02  # шаг временных меток Whisper, сек
+
+# повторное декодирование с температурой, как в whisper.transcribe
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4  # выше — зацикленный повтор текста
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+def transcribe_audio(audio, model_size: str = "medium", sample_rate: int = WHISPER_SR) -> str:
     """
-    Распознаёт речь в аудиофайле с помощью Whisper.
+    Распознаёт речь с помощью Whisper.
 
-    :param audio_path: путь к WAV-файлу
+    :param audio: путь к аудиофайлу или моно numpy-массив
     :param model_size: "tiny", "base", "small", "medium", "large"
+    :param sample_rate: частота массива (для путей не используется)
     :return: расшифрованный текст
     """
     print(f"🔜Распознаём речь (модель: {model_size})...")
-    model = whisper.load_model(model_size)
-    result = model.transcribe(audio_path)
+    model = get_whisper(model_size)
+
+    if isinstance(audio, np.ndarray):
+        audio = audio.astype(np.float32, copy=False)
+        audio = resample(audio, sample_rate, WHISPER_SR)
+    else:
+        audio = str(audio)  # путь декодирует сам Whisper через ffmpeg
+
+    with span("asr.transcribe", "inference", model=model_size) as record:
+        if isinstance(audio, np.ndarray):
+            record["audio_seconds"] = len(audio) / WHISPER_SR
+        result = model.transcribe(audio)
 
     print("✅ Распознавание завершено.")
     return result["text"]
+
+
+def _pack_windows(audio, placements, window_samples):
+    """
+    Раскладывает фрагменты склейки по окнам Whisper подряд, не разрывая их;
+    фрагменты длиннее окна режутся на части.
+
+    :return: список окон; окно — список (номер фрагмента, аудио, смещение в окне)
+    """
+    windows, current, filled = [], [], 0
+    for idx, (offset, length, _, _) in enumerate(placements):
+        for piece_start in range(0, length, window_samples):
+            piece = audio[offset + piece_start:offset + min(length, piece_start + window_samples)]
+            if filled + len(piece) > window_samples:
+                windows.append(current)
+                current, filled = [], 0
+            current.append((idx, piece, filled))
+            filled += len(piece)
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _timed_pieces(tokens, tokenizer, window_sec):
+    """
+    Делит токены ответа по временным меткам.
+
+    :return: список (начало, конец, текст) в секундах от начала окна
+    """
+    pieces, text_tokens, piece_start = [], [], 0.0
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            time = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                pieces.append((piece_start, time, tokenizer.decode(text_tokens)))
+                text_tokens = []
+            piece_start = time
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        pieces.append((piece_start, window_sec, tokenizer.decode(text_tokens)))
+    return pieces
+
+
+def _assign_pieces(window, pieces):
+    """
+    Относит кусочки текста окна к фрагментам склейки.
+
+    :param window: окно из _pack_windows
+    :param pieces: результат _timed_pieces
+    :return: список (номер фрагмента, текст)
+    """
+    bounds = [(offset / WHISPER_SR, (offset + len(piece)) / WHISPER_SR, idx)
+              for idx, piece, offset in window]
+    assigned = []
+    for t0, t1, text in pieces:
+        middle = (t0 + t1) / 2
+        # фрагмент, содержащий середину кусочка, иначе ближайший к ней
+        _, _, idx = min(bounds, key=lambda bd: 0 if bd[0] <= middle < bd[1]
+                        else min(abs(bd[0] - middle), abs(bd[1] - middle)))
+        assigned.append((idx, text))
+    return assigned
+
+
+def _needs_fallback(result):
+    """Тот же критерий, что и в whisper.transcribe: повтор или низкая уверенность, но не тишина."""
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return False
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def _decode_with_fallback(decode, mels, temperatures=TEMPERATURES):
+    """
+    Декодирует пачку окон; окна с повтором текста или низкой уверенностью
+    декодируются заново со следующей температурой (пачкой из оставшихся окон).
+
+    :param decode: функция (mels, temperature) -> список результатов whisper.decode
+    :param mels: тензор (окна, n_mels, кадры)
+    :return: результат для каждого окна (последняя попытка, если ни одна не прошла)
+    """
+    results = [None] * len(mels)
+    pending = list(range(len(mels)))
+    for temperature in temperatures:
+        decoded = decode(mels[pending], temperature)
+        for i, result in zip(pending, decoded):
+            results[i] = result
+        pending = [i for i, result in zip(pending, decoded) if _needs_fallback(result)]
+        if not pending:
+            break
+    return results
+
+
+def transcribe_segments(audio, placements, model_size: str = "medium", language: str = "ru",
+                        batch_size: int = 8, sample_rate: int = WHISPER_SR):
+    """
+    Распознаёт склейку по фрагментам, а не целиком.
+
+    Фрагменты укладываются в 30-секундные окна, окна декодируются пачками
+    с заданным языком и временными метками, а текст каждого кусочка
+    относится к фрагменту, на который приходится его середина. Окна, не
+    прошедшие проверки whisper.transcribe (степень сжатия, средний logprob),
+    декодируются заново с повышением температуры.
+
+    :param audio: склейка из combine_segments (моно numpy-массив)
+    :param placements: положения фрагментов из combine_segments(..., return_placements=True)
+    :param language: язык распознавания (без автоопределения)
+    :param batch_size: число окон в одной пачке
+    :param sample_rate: частота audio и смещений в placements
+    :return: список {"start", "end", "text"} с временем фрагмента в исходной записи
+    """
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    print(f"🔜Распознаём речь по фрагментам (модель: {model_size}, язык: {language})...")
+    model = get_whisper(model_size)
+
+    audio = audio.astype(np.float32, copy=False)
+    if sample_rate != WHISPER_SR:
+        audio = resample(audio, sample_rate, WHISPER_SR)
+        scale = WHISPER_SR / sample_rate
+        placements = [(int(offset * scale), int(length * scale), start, end)
+                      for offset, length, start, end in placements]
+
+    windows = _pack_windows(audio, placements, int(WINDOW_SEC * WHISPER_SR))
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task="transcribe")
+    options = whisper.DecodingOptions(task="transcribe", language=language, without_timestamps=False,
+                                      fp16=model.device.type == "cuda")
+
+    def decode(mels, temperature):
+        return whisper.decode(model, mels, dataclasses.replace(options, temperature=temperature))
+
+    texts = [[] for _ in placements]
+
+    for b in range(0, len(windows), batch_size):
+        batch = windows[b:b + batch_size]
+        mels = []
+        for window in batch:
+            samples = torch.from_numpy(np.concatenate([piece for _, piece, _ in window]))
+            samples = whisper.pad_or_trim(samples)
+            mels.append(whisper.log_mel_spectrogram(samples, n_mels=model.dims.n_mels))
+        audio_seconds = sum(len(piece) for window in batch for _, piece, _ in window) / WHISPER_SR
+        with span("asr.decode", "inference", audio_seconds=audio_seconds, windows=len(batch), model=model_size):
+            with torch.no_grad():
+                results = _decode_with_fallback(decode, torch.stack(mels).to(model.device))
+
+        for window, result in zip(batch, results):
+            # тот же критерий тишины, что и в whisper.transcribe
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                continue
+            for idx, text in _assign_pieces(window, _timed_pieces(result.tokens, tokenizer, WINDOW_SEC)):
+                texts[idx].append(text.strip())
+
+    segments = [{"start": start, "end": end, "text": " ".join(t for t in parts if t)}
+                for (_, _, start, end), parts in zip(placements, texts)]
+    print(f"✅ Распознавание завершено: {len(windows)} окон, {len(segments)} фрагментов.")
+    return [segment for segment in segments if segment["text"]]
+
+
+def segments_to_text(segments) -> str:
+    """Сплошной текст из результата transcribe_segments."""
+    return " ".join(segment["text"] for segment in segments)
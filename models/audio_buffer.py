@@ -0,0 +1,60 @@
+# models/audio_buffer.py
+
+import threading
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from models.resample import resample
+
+
+class AudioBuffer:
+    """
+    Моно-запись, декодированная один раз, с кэшем версий на нужных частотах.
+
+    Все этапы пайплайна берут звук отсюда: 16 кГц для pyannote, Resemblyzer
+    и Whisper, 8 кГц для Sepformer. Каждая частота считается не более одного раза.
+    """
+
+    def __init__(self, samples, sample_rate, path=None):
+        self.path = str(path) if path is not None else None
+        self.sample_rate = sample_rate
+        self._views = {sample_rate: np.ascontiguousarray(samples, dtype=np.float32)}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """Декодирует файл в моно float32 с исходной частотой."""
+        try:
+            samples, sr = sf.read(str(path), dtype="float32", always_2d=True)
+            samples = samples.mean(axis=1)
+        except RuntimeError:
+            # форматы, которые не читает libsndfile (mp3 в старых версиях и т.п.)
+            import librosa
+            samples, sr = librosa.load(str(path), sr=None, mono=True)
+        return cls(samples, sr, path=path)
+
+    @property
+    def name(self):
+        return Path(self.path).stem if self.path else "audio"
+
+    @property
+    def duration(self):
+        return len(self._views[self.sample_rate]) / self.sample_rate
+
+    def get(self, sample_rate):
+        """
+        :param sample_rate: нужная частота
+        :return: float32 numpy-массив (общий для всех вызывающих — не изменять)
+        """
+        with self._lock:
+            if sample_rate not in self._views:
+                self._views[sample_rate] = resample(self._views[self.sample_rate], self.sample_rate, sample_rate)
+            return self._views[sample_rate]
+
+    def as_pyannote(self, sample_rate=16000):
+        """Вход для pyannote Pipeline без повторного чтения файла."""
+        waveform = torch.from_numpy(self.get(sample_rate)).unsqueeze(0)
+        return {"waveform": waveform, "sample_rate": sample_rate, "uri": self.name}
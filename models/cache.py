@@ -0,0 +1,157 @@
+# models/cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("SPEECH_ANREC_CACHE_DIR", ".cache"))
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, block_size=1 << 20) -> str:
+    """SHA-256 содержимого файла (читается блоками, без загрузки целиком)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш в памяти на maxsize элементов
+    с необязательным временем жизни записей и счётчиками попаданий.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        :param ttl: время жизни записи, сек (None — бессрочно)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] is not None and item[1] < time.time():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, expires=None):
+        """
+        :param expires: момент истечения записи (time.time()), если он раньше, чем через ttl
+        """
+        if self.ttl is not None:
+            expires = min(time.time() + self.ttl, expires if expires is not None else float("inf"))
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteStore:
+    """
+    Основа хранилищ в SQLite: соединение открывается лениво, своё в каждом
+    процессе, и делится потоками процесса (обращения — под self._lock).
+    Подкласс задаёт SCHEMA — запрос CREATE TABLE IF NOT EXISTS.
+    """
+
+    SCHEMA = None
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # соединение нельзя наследовать через fork — открываем своё в каждом процессе
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            self._conn.execute(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+
+class DiskCache(SQLiteStore):
+    """
+    Кэш строк в SQLite с временем жизни записей и ограничением их числа
+    (при переполнении удаляются давно не читавшиеся).
+    """
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """:return: (значение, момент истечения или None) либо None, если записи нет или она истекла"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            expires = row[1] + self.ttl if self.ttl is not None else None
+            if expires is not None and expires < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0], expires
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                         (key, value, now, now))
+            if self.ttl is not None:
+                conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
@@ -0,0 +1,206 @@
+# models/checkpoints.py
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from models.cache import CACHE_DIR, hash_bytes, hash_file
+
+# numpy импортируется в кодеках: для этапов на тексте он не нужен
+
+STAGES = ("diarization", "separation", "combine", "asr", "analysis")
+
+# артефакты этапов — полноразмерное аудио, поэтому кэш ограничен по объёму и сроку жизни
+MAX_BYTES = int(float(os.getenv("SPEECH_ANREC_STAGE_CACHE_MB", "2048")) * (1 << 20))
+TTL = float(os.getenv("SPEECH_ANREC_STAGE_CACHE_DAYS", "30")) * 24 * 3600
+
+
+def _save_json(path, value):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False)
+
+
+def _load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_txt(path, value):
+    Path(path).write_text(value, encoding="utf-8")
+
+
+def _load_txt(path):
+    return Path(path).read_text(encoding="utf-8")
+
+
+def _save_npy(path, value):
+    import numpy as np
+    with open(path, "wb") as f:
+        np.save(f, value)
+
+
+def _load_npy(path):
+    import numpy as np
+    return np.load(path)
+
+
+def _save_streams(path, value):
+    """(target_speaker, [(audio, start, end), ...]) -> npz"""
+    import numpy as np
+    target_speaker, segments = value
+    arrays = {f"stream_{i}": audio for i, (audio, _, _) in enumerate(segments)}
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            target_speaker=np.array(target_speaker),
+            starts=np.array([start for _, start, _ in segments], dtype=np.float64),
+            ends=np.array([end for _, _, end in segments], dtype=np.float64),
+            **arrays
+        )
+
+
+def _load_streams(path):
+    import numpy as np
+    with np.load(path) as data:
+        segments = [(data[f"stream_{i}"], float(start), float(end))
+                    for i, (start, end) in enumerate(zip(data["starts"], data["ends"]))]
+        return str(data["target_speaker"]), segments
+
+
+def _save_placed(path, value):
+    """(audio, [(offset, length, start, end), ...]) -> npz"""
+    import numpy as np
+    audio, placements = value
+    with open(path, "wb") as f:
+        np.savez(f, audio=audio, placements=np.array(placements, dtype=np.float64).reshape(-1, 4))
+
+
+def _load_placed(path):
+    import numpy as np
+    with np.load(path) as data:
+        placements = [(int(offset), int(length), float(start), float(end))
+                      for offset, length, start, end in data["placements"]]
+        return data["audio"], placements
+
+
+CODECS = {
+    "json": (".json", _save_json, _load_json),
+    "txt": (".txt", _save_txt, _load_txt),
+    "npy": (".npy", _save_npy, _load_npy),
+    "streams": (".npz", _save_streams, _load_streams),
+    "placed": (".npz", _save_placed, _load_placed),
+}
+
+
+class StageCache:
+    """
+    Кэш результатов этапов пайплайна с адресацией по содержимому.
+
+    Ключ этапа — хеш его параметров и хешей входных артефактов (исходного файла
+    или результатов предыдущих этапов). Если ключ не изменился, этап
+    пропускается и результат читается с диска.
+
+    После каждой записи удаляются артефакты, не использовавшиеся дольше ttl,
+    а если кэш всё ещё больше max_bytes — давно не читавшиеся (время
+    использования — mtime файла, обновляется при попадании).
+    """
+
+    def __init__(self, root=None, force=(), enabled=True, max_bytes=None, ttl=None):
+        """
+        :param root: каталог кэша (по умолчанию CACHE_DIR/stages)
+        :param force: этапы, которые нужно пересчитать независимо от кэша
+        :param enabled: False — всегда считать и ничего не сохранять
+        :param max_bytes: предельный объём кэша (None — SPEECH_ANREC_STAGE_CACHE_MB, 2 ГБ)
+        :param ttl: время жизни неиспользуемого артефакта, сек (None — SPEECH_ANREC_STAGE_CACHE_DAYS, 30 дней)
+        """
+        self.root = Path(root) if root else CACHE_DIR / "stages"
+        self.force = set(force)
+        self.enabled = enabled
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = TTL if ttl is None else ttl
+
+    @staticmethod
+    def key(stage, **parts):
+        payload = json.dumps({"stage": stage, **parts}, sort_keys=True, default=str)
+        return hash_bytes(payload.encode("utf-8"))
+
+    def run(self, stage, fmt, compute, **parts):
+        """
+        Возвращает результат этапа из кэша или вычисляет и сохраняет его.
+
+        :param stage: имя этапа (одно из STAGES)
+        :param fmt: формат артефакта (ключ CODECS)
+        :param compute: функция без аргументов, вычисляющая результат
+        :param parts: всё, от чего зависит результат (хеши входов, параметры)
+        :return: (результат, хеш артефакта — для ключей следующих этапов)
+        """
+        if not self.enabled:
+            return compute(), None
+
+        ext, save, load = CODECS[fmt]
+        key = self.key(stage, **parts)
+        path = self.root / stage / f"{key}{ext}"
+
+        if stage not in self.force and path.exists():
+            try:
+                os.utime(path)  # отметка использования для вытеснения
+                value = load(path)
+                print(f"♻️ Этап «{stage}» взят из кэша ({key[:12]})")
+                return value, hash_file(path)
+            except FileNotFoundError:
+                pass  # артефакт вытеснил другой процесс — считаем заново
+
+        value = compute()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # своё имя у каждого писателя: один ключ могут считать несколько потоков и процессов
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+        os.close(fd)
+        try:
+            save(tmp_path, value)
+            os.replace(tmp_path, path)  # атомарно: недописанный файл не попадёт в кэш
+        except OSError:
+            if not path.exists():
+                raise
+            # другой писатель уже сохранил тот же ключ — берём его файл
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        digest = hash_file(path)
+        self.evict(keep=path)
+        return value, digest
+
+    def evict(self, keep=None):
+        """
+        Удаляет устаревшие артефакты, затем самые давние — пока кэш не уложится в max_bytes.
+
+        :param keep: файл, который удалять нельзя (только что записанный)
+        :return: число удалённых файлов
+        """
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.suffix == ".tmp" or path == keep:
+                continue  # недописанные файлы других писателей не трогаем
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and keep.exists():
+            total += keep.stat().st_size
+        now = time.time()
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and mtime + self.ttl >= now:
+                break
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
@@ -1,60 +1,104 @@
+import bisect
+
 import numpy as np
 import soundfile as sf
-import torch
-import torchaudio
 
-def overlaps_with_existing(start, end, existing_intervals):
-    for existing_start, existing_end in existing_intervals:
-        if not (end <= existing_start or start >= existing_end):
-            return True
-    return False
+from models.resample import resample
+
+
+class IntervalIndex:
+    """
+    Отсортированный набор непересекающихся интервалов.
+
+    Пересекающиеся интервалы при добавлении сливаются, поэтому и начала, и концы
+    остаются отсортированными, а проверка пересечения — один bisect, O(log n).
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_left(self.starts, end)  # интервалы [0, i) начинаются раньше end
+        return i > 0 and self.ends[i - 1] > start
+
+    def add(self, start, end):
+        lo = bisect.bisect_right(self.ends, start)
+        hi = bisect.bisect_left(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
 
-def combine_segments(mono_segments, target_segments, target_speaker, y, sr, output_path):
+def _load_chunk(path, sr):
+    """Читает WAV с диска и приводит его к моно с частотой sr."""
+    chunk, chunk_sr = sf.read(path, dtype="float32")
+    if chunk.ndim == 2:
+        chunk = chunk.mean(axis=1)
+    return resample(chunk, chunk_sr, sr)
+
+
+def combine_segments(mono_segments, target_segments, target_speaker, y, sr, output_path=None,
+                     return_placements=False):
+    """
+    Склеивает фрагменты целевого спикера в хронологическом порядке.
+
+    Фрагменты записываются в один заранее выделенный буфер; mono-фрагменты
+    берутся из y без копирования до момента записи.
+
+    :param output_path: куда дополнительно сохранить WAV (None — не сохранять)
+    :param return_placements: вернуть ещё и положение каждого фрагмента
+    :return: float32 numpy-массив с частотой sr; при return_placements — пара
+             (массив, [(offset, length, start, end), ...]), где offset и length — в семплах
+             склейки, start и end — время фрагмента в исходной записи
+    """
     print("🔜 Объединяем все фрагменты целевого спикера...")
 
     all_chunks = []
-    used_intervals = []
+    used_intervals = IntervalIndex()
 
     # --- 1. Mono сегменты
     for start, end, speaker in mono_segments:
         if speaker == target_speaker:
             start_sample = int(start * sr)
             end_sample = int(end * sr)
-            chunk = y[start_sample:end_sample]
-            all_chunks.append((start, chunk))
-            used_intervals.append((start, end))
+            all_chunks.append((start, end, y[start_sample:end_sample]))
+            used_intervals.add(start, end)
 
     # --- 2. Разделённые сегменты (без перекрытия)
-    resampler = torchaudio.transforms.Resample(orig_freq=8000, new_freq=sr)
-
-    for path, start, end in target_segments:
-        if overlaps_with_existing(start, end, used_intervals):
+    for source, start, end in target_segments:
+        if used_intervals.overlaps(start, end):
             continue  # пропускаем дубликат
 
-        chunk, chunk_sr = sf.read(path)
-
-        if chunk_sr != sr:
-            if chunk.ndim == 1:
-                chunk = torch.tensor(chunk, dtype=torch.float32).unsqueeze(0)
-            else:
-                chunk = torch.tensor(chunk.T, dtype=torch.float32)
-            chunk = resampler(chunk).numpy()
-            chunk = chunk.mean(axis=0) if chunk.ndim > 1 else chunk  # моно
-        elif chunk.ndim == 2:
-            chunk = chunk.mean(axis=1)
+        # separation отдаёт массивы уже с частотой sr, пути к WAV читаем с диска
+        chunk = source if isinstance(source, np.ndarray) else _load_chunk(source, sr)
+        all_chunks.append((start, end, chunk))
+        used_intervals.add(start, end)
 
-        all_chunks.append((start, chunk))
-        used_intervals.append((start, end))
-
-    # --- Сортировка и объединение
+    # --- Сортировка и запись в общий буфер
     all_chunks.sort(key=lambda x: x[0])
+    total = sum(len(chunk) for *_, chunk in all_chunks)
+    placements = []
 
-    if all_chunks:
-        combined_audio = np.concatenate([chunk for _, chunk in all_chunks])
+    if total:
+        combined_audio = np.empty(total, dtype=np.float32)
+        offset = 0
+        for start, end, chunk in all_chunks:
+            combined_audio[offset:offset + len(chunk)] = chunk
+            if len(chunk):
+                placements.append((offset, len(chunk), start, end))
+            offset += len(chunk)
     else:
         print("⚠️ Нет подходящих фрагментов — создаётся пустой WAV.")
         combined_audio = np.zeros(1, dtype=np.float32)  # 1 семпл тишины для валидного WAV
 
-    # --- Сохраняем
-    sf.write(output_path, combined_audio, sr)
-    print(f"✅ Финальный WAV сохранён: {output_path}")
+    # --- Сохраняем (по запросу)
+    if output_path is not None:
+        sf.write(output_path, combined_audio, sr)
+        print(f"✅ Финальный WAV сохранён: {output_path}")
+
+    if return_placements:
+        return combined_audio, placements
+    return combined_audio
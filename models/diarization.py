@@ -1,32 +1,97 @@
 # models/diarization.py
 
-from pyannote.audio import Pipeline
-import os
+from models.audio_buffer import AudioBuffer
+from models.registry import get_diarization_pipeline
+from models.tracing import span
 
-hf_token = os.getenv("HF_TOKEN")
+# меняйте при изменении разбиения на mono/multi: от версии зависит кэш диаризации
+DIARIZATION_VERSION = 3
 
-def run_diarization(audio_path: str):
+
+def segment_table(turns):
+    """
+    Разбивает реплики на участки с постоянным набором активных спикеров.
+
+    Один проход заметающей прямой по отсортированным границам реплик, O(n log n).
+    Соседние участки с одинаковым набором спикеров склеиваются.
+
+    :param turns: итерируемое (start, end, speaker)
+    :return: список (start, end, speakers), speakers — отсортированный кортеж
+    """
+    events = []
+    for start, end, speaker in turns:
+        if end > start:
+            events.append((start, 1, speaker))
+            events.append((end, -1, speaker))
+    events.sort(key=lambda e: e[0])
+
+    table = []
+    active = {}
+    prev = None
+    i = 0
+    while i < len(events):
+        time = events[i][0]
+        if active and prev is not None and time > prev:
+            speakers = tuple(sorted(active))
+            if table and table[-1][2] == speakers and table[-1][1] == prev:
+                table[-1] = (table[-1][0], time, speakers)
+            else:
+                table.append((prev, time, speakers))
+        # все границы в одной точке применяются вместе
+        while i < len(events) and events[i][0] == time:
+            _, delta, speaker = events[i]
+            count = active.get(speaker, 0) + delta
+            if count:
+                active[speaker] = count
+            else:
+                del active[speaker]
+            i += 1
+        prev = time
+    return table
+
+
+def split_segment_table(table):
+    """
+    :param table: результат segment_table
+    :return: mono_segments [(start, end, speaker)], multi_segments [(start, end, [speakers])]
+    """
+    mono_segments, multi_segments = [], []
+    for start, end, speakers in table:
+        if len(speakers) == 1:
+            mono_segments.append((start, end, speakers[0]))
+        else:
+            multi_segments.append((start, end, list(speakers)))
+    return mono_segments, multi_segments
+
+
+def run_diarization(audio_path):
     """
     Выполняет диаризацию аудиофайла.
 
-    :param audio_path: путь к аудиофайлу (wav)
+    В multi_segments попадают только точные участки перекрытия речи, а
+    одноголосые остатки реплик — в mono_segments, поэтому Sepformer
+    обрабатывает лишь то, что действительно нужно разделять.
+
+    :param audio_path: путь к аудиофайлу (wav) или уже декодированный AudioBuffer
     :return: mono_segments, multi_segments, full diarization object
     """
     print("Запуск диаризации...")
-    pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization", use_auth_token=hf_token)
+    pipeline = get_diarization_pipeline()
 
-    diarization = pipeline(audio_path)
-
-    mono_segments = []
-    multi_segments = []
+    with span("diarization.pyannote", "inference") as record:
+        if isinstance(audio_path, AudioBuffer):
+            record["audio_seconds"] = audio_path.duration
+            diarization = pipeline(audio_path.as_pyannote())
+        else:
+            diarization = pipeline(str(audio_path))
 
+    turns = []
     for turn, _, speaker in diarization.itertracks(yield_label=True):
         print(f"Speaker {speaker}: {turn.start:.1f}s - {turn.end:.1f}s")
-        overlapping = diarization.crop(turn, mode="loose").labels()
-        if len(overlapping) == 1:
-            mono_segments.append((turn.start, turn.end, speaker))
-        else:
-            multi_segments.append((turn.start, turn.end, overlapping))  # сохраним список спикеров
+        turns.append((turn.start, turn.end, speaker))
+
+    with span("diarization.segment_table", "postprocess", turns=len(turns)):
+        mono_segments, multi_segments = split_segment_table(segment_table(turns))
 
     print(f"Диаризация завершена. mono: {len(mono_segments)}, multi: {len(multi_segments)}")
     return mono_segments, multi_segments, diarization
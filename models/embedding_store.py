@@ -0,0 +1,115 @@
+# models/embedding_store.py
+
+import threading
+import time
+from importlib import metadata
+
+import numpy as np
+
+from models.cache import CACHE_DIR, LRUCache, SQLiteStore, hash_file
+from models.tracing import span
+
+
+def encoder_version(encoder) -> str:
+    """
+    Версия кодировщика: при её смене старые эмбеддинги перестают использоваться.
+
+    В версию входит класс кодировщика, поэтому эмбеддинги заглушки или другого
+    кодировщика не смешиваются с эмбеддингами VoiceEncoder.
+    """
+    try:
+        version = metadata.version("resemblyzer")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"resemblyzer-{version}:{type(encoder).__module__}.{type(encoder).__qualname__}"
+
+
+class EmbeddingStore(SQLiteStore):
+    """
+    Хранилище эмбеддингов эталонных голосов: SQLite на диске + LRU в памяти.
+
+    Ключ — SHA-256 содержимого аудиофайла и версия кодировщика, поэтому
+    переименование файла не сбрасывает кэш, а изменение содержимого — сбрасывает.
+    """
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS embeddings ("
+              "key TEXT, version TEXT, data BLOB, created REAL, PRIMARY KEY (key, version))")
+
+    def __init__(self, path=None, memory_size=128):
+        super().__init__(path or CACHE_DIR / "embeddings.sqlite")
+        self._memory = LRUCache(memory_size)
+
+    def get(self, key, version):
+        embed = self._memory.get((key, version))
+        if embed is not None:
+            return embed
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT data FROM embeddings WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+        if row is None:
+            return None
+        embed = np.frombuffer(row[0], dtype=np.float32).copy()
+        self._memory.put((key, version), embed)
+        return embed
+
+    def put(self, key, version, embed):
+        embed = np.asarray(embed, dtype=np.float32)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, version, data, created) VALUES (?, ?, ?, ?)",
+                (key, version, embed.tobytes(), time.time())
+            )
+            conn.commit()
+        self._memory.put((key, version), embed)
+
+    def get_or_compute(self, audio_path, encoder):
+        """
+        Возвращает эмбеддинг файла из кэша или считает и сохраняет его.
+
+        :param audio_path: путь к эталонному аудио
+        :param encoder: VoiceEncoder
+        :return: (id эмбеддинга, эмбеддинг)
+        """
+        key = hash_file(audio_path)
+        version = encoder_version(encoder)
+        embed = self.get(key, version)
+        if embed is None:
+            from resemblyzer import preprocess_wav
+            from resemblyzer.hparams import sampling_rate
+            from models.resample import load_audio
+            wav = preprocess_wav(load_audio(audio_path, sampling_rate), source_sr=sampling_rate)
+            with span("embedding.reference", "inference", audio_seconds=len(wav) / sampling_rate):
+                embed = encoder.embed_utterance(wav)
+            self.put(key, version, embed)
+        return key, embed
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = EmbeddingStore()
+        return _default_store
+
+
+def get_reference_embedding(reference_path, encoder):
+    """Эмбеддинг эталонного голоса через общий кэш процесса."""
+    return get_store().get_or_compute(reference_path, encoder)[1]
+
+
+def get_embedding_by_id(reference_id, encoder):
+    """
+    Эмбеддинг эталона по его id (хешу файла) без самого файла.
+
+    :raises KeyError: для текущей версии кодировщика такого эмбеддинга нет
+    """
+    embed = get_store().get(reference_id, encoder_version(encoder))
+    if embed is None:
+        raise KeyError(f"Эмбеддинг эталона {reference_id} не найден (версия {encoder_version(encoder)})")
+    return embed
@@ -1,20 +1,26 @@
 # models/feedback.py
 
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from models.cache import CACHE_DIR, DiskCache, LRUCache, hash_bytes
+from models.tracing import span
+
+API_URL = 'https://openrouter.ai/api/v1/chat/completions'
+DEFAULT_MODEL = "deepseek/deepseek-chat:free"
+# увеличивать при любом изменении текста build_prompt — старые ответы в кэше станут недействительны
+PROMPT_VERSION = 1
 
-def generate_feedback(transcribed_text: str, total_words: int, unique_words: int, ttr: float,
-                      avg_sentence_length: float, filler_counts: dict, api_key: str) -> str:
-    """
-    Отправляет текст и метрики речи в OpenRouter API и получает рекомендации.
-    """
-    API_URL = 'https://openrouter.ai/api/v1/chat/completions'
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
 
-    prompt = f"""
+def build_prompt(transcribed_text: str, total_words: int, unique_words: int, ttr: float,
+                 avg_sentence_length: float, filler_counts: dict) -> str:
+    return f"""
         Ты — языковой ассистент, который помогает улучшить устную речь. Проанализируй следующие данные и выдай рекомендации на **русском языке**.
         
         Текст речи:
@@ -34,14 +40,237 @@ def generate_feedback(transcribed_text: str, total_words: int, unique_words: int
         3. Как сделать речь более уверенной и выразительной?
         """
 
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [{"role": "user", "content": prompt}]
-    }
 
-    response = requests.post(API_URL, json=data, headers=headers)
+class ResponseCache:
+    """
+    Кэш ответов модели: LRU в памяти поверх SQLite на диске.
+
+    Ключ — хэш имени модели, версии шаблона промпта и самого промпта,
+    так что повторный запуск на той же расшифровке не ходит в API.
+    """
+
+    def __init__(self, path=None, memory_size=256, max_entries=10000, ttl=30 * 24 * 3600):
+        """
+        :param path: файл SQLite (по умолчанию CACHE_DIR/feedback.sqlite, False — только память)
+        :param memory_size: число ответов в памяти
+        :param max_entries: число ответов на диске
+        :param ttl: время жизни ответа, сек (None — бессрочно)
+        """
+        self._memory = LRUCache(memory_size, ttl=ttl)
+        self._disk = None
+        if path is not False:
+            self._disk = DiskCache(path or CACHE_DIR / "feedback.sqlite", max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(model, prompt):
+        return hash_bytes(f"{model}\n{PROMPT_VERSION}\n{prompt}".encode("utf-8"))
+
+    def get(self, key):
+        value = self._memory.get(key)
+        level = "memory"
+        if value is None and self._disk is not None:
+            entry = self._disk.get_entry(key)
+            level = "disk"
+            if entry is not None:
+                # копия в памяти истекает вместе с записью на диске, а не через ttl от чтения
+                value, expires = entry
+                self._memory.put(key, value, expires=expires)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits[level] += 1
+        return value
+
+    def put(self, key, value):
+        self._memory.put(key, value)
+        if self._disk is not None:
+            self._disk.put(key, value)
+
+    def stats(self):
+        """:return: {"memory_hits", "disk_hits", "misses"}"""
+        with self._lock:
+            return {"memory_hits": self.hits["memory"], "disk_hits": self.hits["disk"], "misses": self.misses}
+
+
+class FeedbackClient:
+    """
+    HTTP-клиент OpenRouter для генерации рекомендаций.
+
+    Держит пул соединений, повторяет запросы при 429/5xx с экспоненциальной
+    задержкой (учитывая Retry-After), ограничивает число одновременных
+    запросов и притормаживает, когда X-RateLimit-Remaining доходит до нуля.
+    """
+
+    def __init__(self, api_key, api_url=API_URL, model=DEFAULT_MODEL, timeout=(10, 120),
+                 retries=3, backoff_factor=1.0, max_concurrency=4, cache=None):
+        """
+        :param api_url: адрес API (для тестов — локальный сервер-заглушка)
+        :param timeout: (таймаут соединения, таймаут чтения), сек
+        :param retries: число повторов при 429/5xx и сетевых ошибках
+        :param backoff_factor: база экспоненциальной задержки между повторами, сек
+        :param max_concurrency: максимум одновременных запросов
+        :param cache: ResponseCache для готовых ответов (None — без кэша)
+        """
+        self.api_url = api_url
+        self.cache = cache
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._rate_lock = threading.Lock()
+        self._not_before = 0.0
+
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            delay = self._not_before - time.time()
+        if delay > 0:
+            print(f"⏳ Лимит запросов исчерпан, ждём {delay:.1f} сек...")
+            time.sleep(delay)
+
+    def _update_rate_limit(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            if float(remaining) > 0:
+                return
+            reset = float(reset)
+        except ValueError:
+            return
+        # OpenRouter отдаёт момент сброса в мс от эпохи; поддерживаем и секунды до сброса
+        if reset > 1e12:
+            reset_at = reset / 1000
+        elif reset > 1e9:
+            reset_at = reset
+        else:
+            reset_at = time.time() + reset
+        with self._rate_lock:
+            self._not_before = max(self._not_before, reset_at)
+
+    def complete(self, prompt: str) -> str:
+        """Отправляет один промпт и возвращает текст ответа модели (или ответ из кэша)."""
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.key(self.model, prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        data = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        with self._slots:
+            self._wait_for_rate_limit()
+            with span("http.openrouter", "http", model=self.model) as record:
+                response = self.session.post(self.api_url, json=data, timeout=self.timeout)
+                record["args"]["status"] = response.status_code
+            self._update_rate_limit(response)
+
+        if response.status_code == 200:
+            content = response.json()['choices'][0]['message']['content']
+            if key is not None:
+                self.cache.put(key, content)
+            return content
+        else:
+            raise RuntimeError(f"API error {response.status_code}: {response.text}")
+
+    def generate(self, **metrics) -> str:
+        """:param metrics: аргументы build_prompt"""
+        return self.complete(build_prompt(**metrics))
+
+    def generate_batch(self, items, return_exceptions=True):
+        """
+        Генерирует рекомендации для нескольких текстов параллельно
+        (не больше max_concurrency запросов одновременно).
+
+        :param items: список словарей с аргументами build_prompt
+        :param return_exceptions: вернуть исключение на месте неудачного ответа вместо проброса
+        :return: список ответов в порядке items
+        """
+        def run(item):
+            try:
+                return self.generate(**item)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(run, items))
+
+    async def agenerate(self, **metrics) -> str:
+        """Асинхронный вариант generate (запрос выполняется в отдельном потоке)."""
+        return await asyncio.to_thread(self.generate, **metrics)
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_response_cache = None
 
-    if response.status_code == 200:
-        return response.json()['choices'][0]['message']['content']
-    else:
-        raise RuntimeError(f"API error {response.status_code}: {response.text}")
+
+def get_response_cache() -> ResponseCache:
+    """Общий для процесса кэш ответов в CACHE_DIR."""
+    global _response_cache
+    with _clients_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def get_client(api_key: str, use_cache: bool = True) -> FeedbackClient:
+    """
+    Общий для процесса клиент на каждый ключ API (соединения переиспользуются).
+
+    :param use_cache: False — отдельный общий клиент без кэша ответов (--no-cache)
+    """
+    cache = get_response_cache() if use_cache else None
+    with _clients_lock:
+        if (api_key, use_cache) not in _clients:
+            _clients[api_key, use_cache] = FeedbackClient(api_key, cache=cache)
+        return _clients[api_key, use_cache]
+
+
+def generate_feedback(transcribed_text: str, total_words: int, unique_words: int, ttr: float,
+                      avg_sentence_length: float, filler_counts: dict, api_key: str,
+                      client: FeedbackClient = None) -> str:
+    """
+    Отправляет текст и метрики речи в OpenRouter API и получает рекомендации.
+
+    :param client: клиент с нужными настройками (по умолчанию — общий для api_key)
+    """
+    client = client or get_client(api_key)
+    return client.generate(
+        transcribed_text=transcribed_text,
+        total_words=total_words,
+        unique_words=unique_words,
+        ttr=ttr,
+        avg_sentence_length=avg_sentence_length,
+        filler_counts=filler_counts
+    )
@@ -0,0 +1,116 @@
+# models/quantization.py
+
+import os
+import tempfile
+
+import torch
+from torch import nn
+
+from models.cache import CACHE_DIR
+from models.tracing import span
+
+# увеличивать при изменении набора квантуемых слоёв — старые файлы в кэше перестанут подходить
+QUANTIZATION_VERSION = 1
+QUANTIZED_DIR = CACHE_DIR / "quantized"
+
+PRECISIONS = ("fp32", "int8")
+
+
+def _to_plain_linear(module):
+    """
+    Заменяет подклассы nn.Linear (в Whisper — Linear с приведением типа весов)
+    обычным nn.Linear: quantize_dynamic сопоставляет модули по точному типу.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+            linear = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _to_plain_linear(child)
+    return module
+
+
+def _quantize(module, layers):
+    return torch.ao.quantization.quantize_dynamic(module, layers, dtype=torch.qint8, inplace=True)
+
+
+def quantize_whisper(model):
+    """
+    Все линейные слои Whisper (проекции внимания и MLP энкодера и декодера) — в int8.
+
+    Свёртки энкодера и выходная проекция на словарь (через веса token_embedding)
+    остаются в fp32.
+    """
+    return _quantize(_to_plain_linear(model), {nn.Linear})
+
+
+def quantize_sepformer(model):
+    """Линейные слои трансформерных блоков masknet Sepformer — в int8; энкодер и декодер — fp32."""
+    model.mods.masknet = _quantize(model.mods.masknet, {nn.Linear})
+    return model
+
+
+QUANTIZERS = {
+    "whisper": quantize_whisper,
+    "sepformer": quantize_sepformer,
+}
+# LSTM Resemblyzer не квантуется: в weight_ih первого слоя есть выбросы (|w| до 61 при σ≈1.4),
+# после int8 эмбеддинги расходятся с fp32 до косинуса ~0.7 — идентификация спикера ломается
+
+
+def quantized_path(kind, name, size):
+    model_id = "-".join(str(part).replace("/", "_") for part in (name, size) if part)
+    return QUANTIZED_DIR / f"{kind}-{model_id}-v{QUANTIZATION_VERSION}-torch{torch.__version__}.pt"
+
+
+def _cached_part(kind, model):
+    # у Sepformer в файл уходит только masknet: остальное — обёртка speechbrain с hparams
+    return model.mods.masknet if kind == "sepformer" else model
+
+
+def load_quantized(kind, name, size, loader):
+    """
+    Загружает int8-вариант модели из кэша на диске или квантует fp32-модель и сохраняет её.
+
+    :param loader: функция () -> fp32-модель на cpu
+    :return: модель с динамическим квантованием int8 (только cpu)
+    """
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Модель {kind} не поддерживает int8")
+    path = quantized_path(kind, name, size)
+
+    if path.exists():
+        try:
+            part = torch.load(path, map_location="cpu", weights_only=False)
+            if kind == "whisper":
+                return part
+            model = loader()
+            model.mods.masknet = part
+            return model
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать {path}, квантуем заново: {e}")
+
+    model = loader()
+    with span(f"quantize:{kind}", "model_load"):
+        model = QUANTIZERS[kind](model)
+
+    os.makedirs(QUANTIZED_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=QUANTIZED_DIR)
+    os.close(fd)
+    try:
+        torch.save(_cached_part(kind, model), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return model
+
+
+def model_precision(model):
+    """"int8", если в модели есть динамически квантованные слои, иначе "fp32"."""
+    from torch.ao.nn.quantized import dynamic
+    if isinstance(model, nn.Module) and any(isinstance(m, dynamic.Linear) for m in model.modules()):
+        return "int8"
+    return "fp32"
@@ -0,0 +1,216 @@
+# models/registry.py
+
+import os
+import threading
+import time
+
+from models.tracing import rss_mb, span
+
+DEFAULT_DIARIZATION_MODEL = "pyannote/speaker-diarization"
+DEFAULT_SEPARATION_MODEL = "speechbrain/sepformer-whamr"
+# модели, для которых есть int8-вариант (см. models/quantization.py)
+INT8_MODELS = ("whisper", "sepformer")
+
+_lock = threading.Lock()
+_key_locks = {}
+_models = {}
+_stats = {}
+
+
+def default_device():
+    """
+    Устройство по умолчанию: переменная окружения SPEECH_ANREC_DEVICE,
+    иначе cuda (если доступна), иначе cpu.
+    """
+    device = os.getenv("SPEECH_ANREC_DEVICE")
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def default_precision(kind):
+    """
+    Точность модели по умолчанию из переменной окружения SPEECH_ANREC_PRECISION:
+    "fp32" (по умолчанию) или "int8" — Whisper и Sepformer с динамическим
+    квантованием линейных слоёв; pyannote и Resemblyzer всегда в fp32.
+    """
+    if os.getenv("SPEECH_ANREC_PRECISION", "fp32") == "int8" and kind in INT8_MODELS:
+        return "int8"
+    return "fp32"
+
+
+def _params_mb(model):
+    """Размер весов torch-модели в МБ или None для не-torch объектов."""
+    import torch
+    if not isinstance(model, torch.nn.Module):
+        return None
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / 2 ** 20
+
+
+def _load_whisper(name, size, device):
+    import whisper
+    return whisper.load_model(size, device=device)
+
+
+def _load_pyannote(name, size, device):
+    import torch
+    from pyannote.audio import Pipeline
+    # токен читаем при загрузке: .env подгружается уже после импорта модулей
+    pipeline = Pipeline.from_pretrained(name, use_auth_token=os.getenv("HF_TOKEN"))
+    if device != "cpu":
+        pipeline.to(torch.device(device))
+    return pipeline
+
+
+def _load_sepformer(name, size, device):
+    from speechbrain.pretrained import SepformerSeparation
+    savedir = f"pretrained_models/{name.split('/')[-1]}"
+    return SepformerSeparation.from_hparams(source=name, savedir=savedir, run_opts={"device": device})
+
+
+def _load_resemblyzer(name, size, device):
+    from resemblyzer import VoiceEncoder
+    return VoiceEncoder(device=device, verbose=False)
+
+
+LOADERS = {
+    "whisper": _load_whisper,
+    "pyannote": _load_pyannote,
+    "sepformer": _load_sepformer,
+    "resemblyzer": _load_resemblyzer,
+}
+
+
+def register_loader(kind, loader):
+    """
+    Подменяет загрузчик моделей типа kind (например, заглушками в бенчмарках).
+
+    Уже загруженные модели этого типа выгружаются.
+
+    :param loader: функция (name, size, device) -> модель
+    :return: прежний загрузчик (None, если тип новый)
+    """
+    with _lock:
+        previous = LOADERS.get(kind)
+        LOADERS[kind] = loader
+        for key in [key for key in _models if key[0] == kind]:
+            del _models[key]
+            _stats.pop(key, None)
+    return previous
+
+
+def get_model(kind, name=None, size=None, device=None, precision=None):
+    """
+    Возвращает модель из реестра процесса, загружая её при первом обращении.
+
+    Ключ реестра — (kind, name, size, device, precision). Загрузка разных
+    моделей может идти параллельно, одна и та же модель грузится ровно один раз.
+
+    :param kind: "whisper", "pyannote", "sepformer" или "resemblyzer"
+    :param name: имя/репозиторий модели
+    :param size: размер модели (для Whisper)
+    :param device: "cpu", "cuda", ...; None — default_device()
+    :param precision: "fp32" или "int8" (динамическое квантование, только cpu); None — default_precision()
+    :return: загруженная модель
+    """
+    if kind not in LOADERS:
+        raise ValueError(f"Неизвестный тип модели: {kind}")
+    device = device or default_device()
+    precision = precision or default_precision(kind)
+    if precision == "int8" and device != "cpu":
+        print(f"⚠️ int8 поддерживается только на cpu, {kind} загружается в fp32 на {device}")
+        precision = "fp32"
+    key = (kind, name, size, device, precision)
+
+    with _lock:
+        if key in _models:
+            return _models[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _lock:
+            if key in _models:
+                return _models[key]
+
+        print(f"⏳ Загрузка модели {kind} ({name or size}, {device}, {precision})...")
+        rss_before = rss_mb()
+        t0 = time.time()
+        with span(f"load:{kind}", "model_load", model=name or size, device=device, precision=precision):
+            if precision == "int8":
+                from models.quantization import load_quantized
+                model = load_quantized(kind, name, size, lambda: LOADERS[kind](name, size, device))
+            else:
+                model = LOADERS[kind](name, size, device)
+        load_time = time.time() - t0
+        rss_delta = max(rss_mb() - rss_before, 0.0)
+
+        with _lock:
+            _models[key] = model
+            _stats[key] = {
+                "load_time": load_time,
+                "rss_mb": rss_delta,
+                # у квантованных слоёв веса упакованы и в parameters() не видны
+                "params_mb": _params_mb(model) if precision == "fp32" else None,
+            }
+        print(f"✅ Модель {kind} загружена за {load_time:.2f} сек (+{rss_delta:.0f} МБ RSS)")
+        return model
+
+
+def get_whisper(size="medium", device=None, precision=None):
+    return get_model("whisper", name="openai/whisper", size=size, device=device, precision=precision)
+
+
+def get_diarization_pipeline(name=DEFAULT_DIARIZATION_MODEL, device=None):
+    return get_model("pyannote", name=name, device=device)
+
+
+def get_sepformer(name=DEFAULT_SEPARATION_MODEL, device=None, precision=None):
+    return get_model("sepformer", name=name, device=device, precision=precision)
+
+
+def get_voice_encoder(device=None, precision=None):
+    return get_model("resemblyzer", name="resemblyzer/voice-encoder", device=device, precision=precision)
+
+
+def warmup(whisper_size="medium", device=None, kinds=("pyannote", "resemblyzer", "sepformer", "whisper")):
+    """
+    Заранее загружает модели пайплайна (например, в воркере пакетного режима).
+
+    :param kinds: какие модели загрузить (по умолчанию — все)
+    """
+    if "pyannote" in kinds:
+        get_diarization_pipeline(device=device)
+    if "resemblyzer" in kinds:
+        get_voice_encoder(device=device)
+    if "sepformer" in kinds:
+        get_sepformer(device=device)
+    if "whisper" in kinds:
+        get_whisper(whisper_size, device=device)
+
+
+def model_stats():
+    """
+    :return: {(kind, name, size, device, precision): {"load_time", "rss_mb", "params_mb"}}
+    """
+    with _lock:
+        return {key: dict(stats) for key, stats in _stats.items()}
+
+
+def print_model_stats():
+    stats = model_stats()
+    if not stats:
+        return
+    print("📦 Загруженные модели:")
+    for (kind, name, size, device, precision), s in stats.items():
+        params = f", веса {s['params_mb']:.0f} МБ" if s["params_mb"] is not None else ""
+        print(f"• {kind} ({name or size}, {device}, {precision}): {s['load_time']:.2f} сек, "
+              f"+{s['rss_mb']:.0f} МБ RSS{params}")
+
+
+def clear():
+    """Выгружает все модели из реестра."""
+    with _lock:
+        _models.clear()
+        _stats.clear()
+        _key_locks.clear()
@@ -0,0 +1,54 @@
+# models/resample.py
+
+import threading
+
+import numpy as np
+import torch
+import torchaudio
+
+_kernels = {}
+_lock = threading.Lock()
+
+
+def get_resampler(orig_freq, new_freq, device="cpu"):
+    """
+    Общий для процесса Resample на пару частот: sinc-ядро считается один раз.
+
+    :return: torchaudio.transforms.Resample
+    """
+    key = (int(orig_freq), int(new_freq), str(device))
+    with _lock:
+        if key not in _kernels:
+            _kernels[key] = torchaudio.transforms.Resample(orig_freq=key[0], new_freq=key[1]).to(device)
+        return _kernels[key]
+
+
+def resample(audio, orig_freq, new_freq):
+    """
+    Передискретизирует numpy-массив или тензор по последней оси.
+
+    При совпадении частот возвращает вход как есть; numpy-массивы float32
+    оборачиваются в тензор без копирования.
+
+    :param audio: (..., samples) numpy-массив или torch.Tensor
+    :return: результат того же типа, что и audio
+    """
+    if orig_freq == new_freq:
+        return audio
+
+    is_numpy = isinstance(audio, np.ndarray)
+    if is_numpy:
+        tensor = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+    else:
+        tensor = audio.float().contiguous()
+
+    with torch.no_grad():
+        result = get_resampler(orig_freq, new_freq, tensor.device)(tensor)
+
+    return result.numpy() if is_numpy else result
+
+
+def load_audio(path, sample_rate):
+    """Читает файл в моно float32 с нужной частотой через общий Resample."""
+    from models.audio_buffer import AudioBuffer
+    return AudioBuffer.from_file(path).get(sample_rate)
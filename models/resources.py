@@ -0,0 +1,160 @@
+# models/resources.py
+
+import os
+import threading
+from contextlib import contextmanager
+
+# меньше двух потоков на задание torch почти не ускоряется от параллельных заданий,
+# а память на копию моделей в каждом воркере уже тратится
+MIN_JOB_THREADS = 2
+
+# Доля потоков задания, которую получает этап. Тяжёлые сети (pyannote, Sepformer,
+# Whisper) берут всё; LSTM Resemblyzer на коротких окнах и sinc-передискретизация
+# при склейке дальше пары потоков не масштабируются.
+STAGE_THREADS = {
+    "diarization": None,
+    "separation": None,
+    "asr": None,
+    "stream": None,
+    "reference_embedding": 2,
+    "combine": 2,
+}
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores():
+    """Номера ядер, на которых процессу разрешено выполняться."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class ResourcePlan:
+    """
+    Распределение ядер между воркерами и этапами.
+
+    throughput — несколько заданий параллельно, у каждого свой набор ядер;
+    latency — одно задание на все ядра.
+    """
+
+    def __init__(self, mode, workers, threads, core_sets):
+        self.mode = mode
+        self.workers = workers
+        self.threads = threads
+        self.core_sets = core_sets
+
+    def stage_threads(self, stage):
+        """Бюджет потоков torch для этапа (для этапов вне STAGE_THREADS — все потоки воркера)."""
+        limit = STAGE_THREADS.get(stage)
+        return max(1, min(self.threads, limit)) if limit else self.threads
+
+    def describe(self):
+        return (f"{self.mode}: воркеров {self.workers}, потоков на воркер {self.threads}, "
+                f"ядра {', '.join(_format_cores(cores) for cores in self.core_sets)}")
+
+
+def _format_cores(cores):
+    return f"{cores[0]}-{cores[-1]}" if len(cores) > 1 else str(cores[0])
+
+
+def plan_resources(jobs, mode="auto", workers=None, max_workers=None, cores=None):
+    """
+    Выбирает число воркеров и потоков на воркер.
+
+    :param jobs: сколько заданий ждёт обработки (глубина очереди)
+    :param mode: "throughput", "latency" или "auto" — latency для одного задания
+                 или если ядер не хватает на два воркера, иначе throughput
+    :param workers: фиксированное число воркеров (ядра делятся между ними поровну, mode не учитывается)
+    :param max_workers: верхняя граница числа воркеров (например, по памяти на копии моделей)
+    :param cores: номера доступных ядер (по умолчанию — affinity процесса)
+    :return: ResourcePlan
+    """
+    cores = list(cores or available_cores())
+    if mode not in ("auto", "throughput", "latency"):
+        raise ValueError(f"Неизвестный режим: {mode}")
+
+    if workers:
+        mode = "throughput" if workers > 1 else "latency"
+    else:
+        if mode == "auto":
+            mode = "throughput" if jobs > 1 and len(cores) >= 2 * MIN_JOB_THREADS else "latency"
+        workers = 1 if mode == "latency" else max(1, min(jobs, len(cores) // MIN_JOB_THREADS))
+        if max_workers:
+            workers = min(workers, max_workers)
+
+    # ядра делятся на непрерывные наборы; если воркеров больше, чем ядер, наборы повторяются
+    per_worker = max(1, len(cores) // workers)
+    core_sets = [cores[(i * per_worker) % len(cores):][:per_worker] for i in range(workers)]
+    return ResourcePlan(mode, workers, per_worker, core_sets)
+
+
+_plan = None
+_active = []
+_active_lock = threading.Lock()
+
+
+def apply_plan(plan, worker_index=0, pin=True):
+    """
+    Настраивает текущий процесс под план: число потоков torch и BLAS
+    и (на Linux) привязку к набору ядер воркера.
+
+    :param worker_index: номер воркера в плане
+    :param pin: привязать процесс к ядрам воркера
+    """
+    global _plan
+    _plan = plan
+    cores = plan.core_sets[worker_index % len(plan.core_sets)]
+    for var in _THREAD_ENV:
+        os.environ[var] = str(plan.threads)
+    if pin and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f"⚠️ Не удалось привязать процесс к ядрам {_format_cores(cores)}: {e}")
+
+    import torch
+    torch.set_num_threads(plan.threads)
+    try:
+        # меняется только до первой параллельной операции в процессе
+        torch.set_num_interop_threads(max(1, min(plan.threads, 2)))
+    except RuntimeError:
+        pass
+
+
+def get_plan():
+    return _plan
+
+
+@contextmanager
+def stage_threads(stage):
+    """
+    Ограничивает потоки torch на время этапа по бюджету активного плана.
+
+    Параллельно идущие этапы одного процесса (например, эмбеддинг эталона
+    во время диаризации) получают наибольший из своих бюджетов.
+    Без плана ничего не делает.
+    """
+    plan = _plan
+    if plan is None:
+        yield
+        return
+    import torch
+    budget = plan.stage_threads(stage)
+    with _active_lock:
+        _active.append(budget)
+        torch.set_num_threads(max(_active))
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active.remove(budget)
+            torch.set_num_threads(max(_active) if _active else plan.threads)
+
+
+def budgeted(stage, fn):
+    """Обёртка функции задачи: fn выполняется внутри stage_threads(stage)."""
+    def run(*args):
+        with stage_threads(stage):
+            return fn(*args)
+    return run
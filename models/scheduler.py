@@ -0,0 +1,112 @@
+# models/scheduler.py
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from models.tracing import span
+
+
+class TaskGraph:
+    """
+    Небольшой планировщик задач с зависимостями (DAG) на потоках.
+
+    Задача запускается, как только готовы все её зависимости, поэтому
+    независимая работа (загрузка моделей, эмбеддинг эталона, декодирование)
+    идёт параллельно с долгими этапами вроде диаризации.
+    """
+
+    def __init__(self, max_workers=4, listener=None):
+        """
+        :param listener: функция (имя задачи, событие, секунды от старта), событие —
+                         "start", "done" или "error"; вызывается из потоков задач
+        """
+        self.max_workers = max_workers
+        self.listener = listener
+        self.tasks = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, deps=()):
+        """
+        :param name: имя задачи
+        :param fn: функция, получающая результаты зависимостей позиционно, в порядке deps
+        :param deps: имена задач, от которых зависит эта
+        """
+        if name in self.tasks:
+            raise ValueError(f"Задача {name} уже добавлена")
+        missing = [d for d in deps if d not in self.tasks]
+        if missing:
+            raise ValueError(f"Неизвестные зависимости задачи {name}: {', '.join(missing)}")
+        self.tasks[name] = (fn, tuple(deps))
+        return self
+
+    def _call(self, name, args, t_start):
+        fn, _ = self.tasks[name]
+        start = time.time() - t_start
+        self._notify(name, "start", start)
+        event = "error"
+        try:
+            with span(name, "task"):
+                result = fn(*args)
+            event = "done"
+            return result
+        finally:
+            end = time.time() - t_start
+            with self._lock:
+                self.timings[name] = (start, end)
+            self._notify(name, event, end)
+
+    def _notify(self, name, event, elapsed):
+        if self.listener is not None:
+            try:
+                self.listener(name, event, elapsed)
+            except Exception as e:
+                print(f"⚠️ Ошибка обработчика событий задачи {name}: {e}")
+
+    def run(self):
+        """
+        Выполняет все задачи. При ошибке ждёт уже запущенные задачи и
+        пробрасывает первое исключение.
+
+        :return: {имя задачи: результат}
+        """
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+        t_start = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name, (_, deps) in list(pending.items()):
+                    if all(d in results for d in deps):
+                        args = [results[d] for d in deps]
+                        running[pool.submit(self._call, name, args, t_start)] = name
+                        del pending[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        wait(running)
+                        raise error
+                    results[name] = future.result()
+        return results
+
+    def critical_path(self):
+        """
+        Цепочка задач, определившая общее время: от последней завершившейся
+        задачи назад по зависимости, завершившейся позже остальных.
+
+        :return: список (имя, начало, конец) в секундах от старта
+        """
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = []
+        while name is not None:
+            path.append((name, *self.timings[name]))
+            deps = [d for d in self.tasks[name][1] if d in self.timings]
+            name = max(deps, key=lambda d: self.timings[d][1]) if deps else None
+        return path[::-1]
@@ -1,56 +1,152 @@
-from speechbrain.pretrained import SepformerSeparation as separator
 from resemblyzer import preprocess_wav
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 import os
 import torch
 import soundfile as sf
-import torchaudio
 
-def run_separation(y, sr, multi_segments, target_speaker, ref_embed, encoder, output_dir="separated_segments"):
+from models.audio_buffer import AudioBuffer
+from models.registry import get_sepformer
+from models.resample import resample
+from models.speaker_id import cosine_scores, embed_utterances
+from models.tracing import span
+
+SEPFORMER_SR = 8000
+# Sepformer видит дополнение нулями (GroupNorm, внимание между чанками), поэтому в одну пачку
+# попадают только фрагменты, у которых нули занимают не больше этой доли длины
+MAX_PADDING = 0.1
+
+
+def _pad_batch(chunks):
+    batch = torch.zeros(len(chunks), max(len(chunk) for chunk in chunks))
+    for row, chunk in enumerate(chunks):
+        batch[row, :len(chunk)] = torch.from_numpy(chunk)
+    return batch
+
+
+def _length_batches(lengths, batch_size, max_padding=MAX_PADDING):
+    """
+    Группирует фрагменты в пачки по возрастанию длины. Новая пачка начинается,
+    когда текущая заполнена или самый короткий её фрагмент пришлось бы
+    дополнить нулями больше чем на max_padding длины нового.
+
+    :param lengths: длины фрагментов
+    :return: список пачек — списков индексов в lengths
+    """
+    batches, current = [], []
+    for k in sorted(range(len(lengths)), key=lambda k: lengths[k]):
+        if current and (len(current) == batch_size or lengths[current[0]] < lengths[k] * (1 - max_padding)):
+            batches.append(current)
+            current = []
+        current.append(k)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _separate_batch(separation_model, chunks, sr, mix_chunks=None):
+    """
+    Разделяет пачку фрагментов одним вызовом Sepformer.
+
+    Фрагменты дополняются нулями до самого длинного и передискретизируются
+    всей пачкой сразу.
+
+    :param chunks: список 1D numpy-массивов с частотой sr
+    :param mix_chunks: те же фрагменты на 8 кГц (если уже есть — без передискретизации)
+    :return: список массивов (2, <=len(chunk)) с двумя потоками на частоте sr
+    """
+    with torch.no_grad():
+        if mix_chunks is None:
+            mix = resample(_pad_batch(chunks), sr, SEPFORMER_SR)
+        else:
+            mix = _pad_batch(mix_chunks)
+        est_sources = separation_model.separate_batch(mix)  # (batch, samples, 2)
+        est_sources = est_sources.permute(0, 2, 1).contiguous().detach().cpu()
+        est_sources = resample(est_sources, SEPFORMER_SR, sr)
+
+    return [est_sources[row, :, :len(chunk)].numpy() for row, chunk in enumerate(chunks)]
+
+
+def run_separation(y, sr, multi_segments, target_speaker, ref_embed, encoder, output_dir="separated_segments",
+                   debug=False, batch_size=8, max_padding=MAX_PADDING):
+    """
+    Разделяет перекрывающиеся сегменты с участием целевого спикера и выбирает
+    поток, наиболее похожий на эталон. Всё считается в памяти, сегменты идут
+    в Sepformer мини-пачками.
+
+    :param y: запись с частотой sr или AudioBuffer (тогда берётся готовая 8 кГц версия)
+    :param debug: сохранять входы и оба потока каждого сегмента в output_dir
+    :param batch_size: число сегментов в одной пачке Sepformer
+    :param max_padding: допустимая доля нулей в пачке (0 — только фрагменты одной длины)
+    :return: список (audio, start, end), audio — numpy-массив с частотой sr
+    """
     print("🔜 Запуск separation по перекрывающимся сегментам...")
 
-    os.makedirs(output_dir, exist_ok=True)
-    separation_model = separator.from_hparams(source="speechbrain/sepformer-whamr", savedir="pretrained_models/sepformer-whamr")
+    separation_model = get_sepformer()
+    if debug:
+        os.makedirs(output_dir, exist_ok=True)
 
-    target_segments = []
+    mix = None
+    if isinstance(y, AudioBuffer):
+        y, mix = y.get(sr), y.get(SEPFORMER_SR)
 
+    selected = []
     for idx, (start, end, speakers_in_turn) in enumerate(multi_segments):
         if target_speaker not in speakers_in_turn:
             continue
+        chunk = y[int(start * sr):int(end * sr)].astype("float32")
+        if len(chunk):
+            selected.append((idx, start, end, chunk))
 
-        print(f"\nСегмент {idx}: {start:.2f}-{end:.2f} (целевой участвует)")
-        start_sample = int(start * sr)
-        end_sample = int(end * sr)
-        segment_tensor = torch.tensor(y[start_sample:end_sample]).unsqueeze(0)
-        temp_input = f"{output_dir}/segment_{idx}_input.wav"
-        torchaudio.save(temp_input, segment_tensor, sr)
-
-        est_sources = separation_model.separate_file(path=temp_input)  # (1, samples, 2)
-        source1 = est_sources[0, :, 0].detach().cpu().numpy()
-        source2 = est_sources[0, :, 1].detach().cpu().numpy()
+    target_segments = []
 
-        path1 = f"{output_dir}/segment_{idx}_stream_0.wav"
-        path2 = f"{output_dir}/segment_{idx}_stream_1.wav"
-        sf.write(path1, source1, 8000, subtype="PCM_16")
-        sf.write(path2, source2, 8000, subtype="PCM_16")
+    for indices in _length_batches([len(chunk) for *_, chunk in selected], batch_size, max_padding):
+        batch = [selected[k] for k in indices]
+        mix_chunks = None
+        if mix is not None:
+            mix_chunks = [mix[int(start * SEPFORMER_SR):int(end * SEPFORMER_SR)] for _, start, end, _ in batch]
+        with span("separation.sepformer", "inference", audio_seconds=sum(len(c) for *_, c in batch) / sr,
+                  segments=[idx for idx, *_ in batch]):
+            streams = _separate_batch(separation_model, [chunk for *_, chunk in batch], sr, mix_chunks)
 
-        best_sim, best_path = -1, None
-        for i, path in enumerate([path1, path2]):
+        # оба потока всех сегментов пачки кодируются одним пакетным прогоном
+        wavs, positions = [], []
+        for row, sources in enumerate(streams):
+            for i, source in enumerate(sources):
+                try:
+                    wavs.append(preprocess_wav(source, source_sr=sr))
+                    positions.append((row, i))
+                except Exception as e:
+                    print(f"Ошибка ID потока {i} (сегмент {batch[row][0]}): {e}")
+        sims = np.full((len(batch), 2), -1.0)
+        if wavs:
             try:
-                wav = preprocess_wav(path, source_sr=8000)
-                embed = encoder.embed_utterance(wav)
-                sim = cosine_similarity(ref_embed.reshape(1, -1), embed.reshape(1, -1))[0][0]
+                rows, cols = zip(*positions)
+                sims[list(rows), list(cols)] = cosine_scores(embed_utterances(wavs, encoder), ref_embed)
+            except Exception:
+                # один плохой поток не должен ронять всю пачку — кодируем потоки по одному
+                for wav, (row, i) in zip(wavs, positions):
+                    try:
+                        sims[row, i] = cosine_scores(embed_utterances([wav], encoder), ref_embed)[0]
+                    except Exception as e:
+                        print(f"Ошибка ID потока {i} (сегмент {batch[row][0]}): {e}")
+
+        for row, ((idx, start, end, chunk), sources) in enumerate(zip(batch, streams)):
+            print(f"\nСегмент {idx}: {start:.2f}-{end:.2f} (целевой участвует)")
+            if debug:
+                sf.write(f"{output_dir}/segment_{idx}_input.wav", chunk, sr, subtype="PCM_16")
+                for i, source in enumerate(sources):
+                    sf.write(f"{output_dir}/segment_{idx}_stream_{i}.wav", source, sr, subtype="PCM_16")
+
+            for i, sim in enumerate(sims[row]):
                 print(f"     Поток {i}: similarity = {sim:.4f}")
-                if sim > best_sim:
-                    best_sim = sim
-                    best_path = path
-            except Exception as e:
-                print(f"Ошибка ID потока {i}: {e}")
-
-        if best_sim > 0.5:
-            print(f"     ✅ Выбран поток: {best_path} (sim={best_sim:.4f})")
-            target_segments.append((best_path, start, end))
-        else:
-            print("Ни один поток не прошёл порог.")
+            best_stream = int(np.argmax(sims[row]))
+            best_sim = sims[row, best_stream]
+
+            if best_sim > 0.5:
+                print(f"     ✅ Выбран поток: {best_stream} (sim={best_sim:.4f})")
+                target_segments.append((sources[best_stream], start, end))
+            else:
+                print("Ни один поток не прошёл порог.")
 
+    target_segments.sort(key=lambda x: x[1])
     return target_segments
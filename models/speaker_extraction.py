@@ -4,10 +4,11 @@ from pathlib import Path
 from models.speaker_id import identify_target_speaker
 from models.separation import run_separation
 from models.combine import combine_segments
+from models.audio_buffer import AudioBuffer
 import os
 
 def extract_target_speaker(reference_path, audio_path, mono_segments, multi_segments,
-                           output_dir, debug=False):
+                           output_dir, debug=False, name=None, save_audio=False):
     """
     Полный процесс извлечения целевого спикера:
     1. Идентификация спикера
@@ -15,42 +16,48 @@ def extract_target_speaker(reference_path, audio_path, mono_segments, multi_segm
     3. Объединение всех фрагментов в WAV
 
     :param reference_path: путь к эталонному голосу
-    :param audio_path: путь к многоспикерному аудио
+    :param audio_path: путь к многоспикерному аудио или декодированный AudioBuffer
     :param mono_segments: список (start, end, speaker) с одиночной речью
     :param multi_segments: список (start, end, [speakers]) с перекрытием
     :param output_dir: папка для сохранения результатов
     :param debug: добавлять постфикс имени входного файла
-    :return: (путь к итоговому wav, имя target_speaker)
+    :param name: явное имя итогового файла (важнее debug)
+    :param save_audio: дополнительно сохранить итоговый WAV на диск
+    :return: (float32-массив 16 кГц, путь к итоговому wav или None, имя target_speaker)
     """
     output_dir = Path(output_dir)
-    basename = Path(audio_path).stem if debug else ""
-    suffix = f"{basename}" if debug else ""
+    audio = audio_path if isinstance(audio_path, AudioBuffer) else AudioBuffer.from_file(audio_path)
+    basename = audio.name if debug else ""
+    suffix = name or (f"{basename}" if debug else "")
 
     # 1. Идентификация спикера
     target_speaker, ref_embed, y, sr, encoder = identify_target_speaker(
         reference_path=reference_path,
-        audio_path=audio_path,
+        audio_path=audio,
         mono_segments=mono_segments,
         sample_rate=16000
     )
 
     # 2. Разделение перекрывающихся фрагментов
     target_segments = run_separation(
-        y=y,
+        y=audio,
         sr=sr,
         multi_segments=multi_segments,
         target_speaker=target_speaker,
         ref_embed=ref_embed,
         encoder=encoder,
-        output_dir=output_dir / "separated_segments"
+        output_dir=output_dir / "separated_segments",
+        debug=debug
     )
 
-    # 3. Объединение всех фрагментов в WAV
-    os.makedirs(output_dir/"target_speaker_combined", exist_ok=True)
-    output_dir = output_dir / "target_speaker_combined"
-    final_path = output_dir / f"{suffix}.wav"
-    print("DEBUG FINAL PATH:", final_path)
-    combine_segments(
+    # 3. Объединение всех фрагментов (WAV сохраняется по запросу)
+    final_path = None
+    if save_audio or debug:
+        os.makedirs(output_dir/"target_speaker_combined", exist_ok=True)
+        output_dir = output_dir / "target_speaker_combined"
+        final_path = output_dir / f"{suffix}.wav"
+        print("DEBUG FINAL PATH:", final_path)
+    combined_audio = combine_segments(
         mono_segments=mono_segments,
         target_segments=target_segments,
         target_speaker=target_speaker,
@@ -59,4 +66,4 @@ def extract_target_speaker(reference_path, audio_path, mono_segments, multi_segm
         output_path=final_path
     )
 
-    return final_path, target_speaker
+    return combined_audio, final_path, target_speaker
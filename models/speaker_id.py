@@ -1,37 +1,122 @@
 import numpy as np
-from resemblyzer import VoiceEncoder, preprocess_wav
-from sklearn.metrics.pairwise import cosine_similarity
-import librosa
+from resemblyzer import audio, preprocess_wav
+from resemblyzer.hparams import sampling_rate
+import torch
 
-def identify_target_speaker(reference_path, audio_path, mono_segments, sample_rate=16000):
-    print("🔜 Определение целевого спикера...")
+from models.audio_buffer import AudioBuffer
+from models.embedding_store import get_reference_embedding
+from models.registry import get_voice_encoder
+from models.resample import load_audio
+from models.tracing import span
+
+def embed_utterances(wavs, encoder, batch_size=256, rate=1.3, min_coverage=0.75):
+    """
+    Пакетный аналог encoder.embed_utterance для списка wav.
+
+    Частичные окна всех фрагментов собираются в большие пачки для LSTM,
+    затем усредняются по фрагментам и нормируются, как в embed_utterance.
+
+    :param wavs: список wav после preprocess_wav
+    :param batch_size: число частичных окон в одном прогоне кодировщика
+    :return: массив (len(wavs), 256) единичных эмбеддингов
+    """
+    with span("embedding", "inference", audio_seconds=sum(len(w) for w in wavs) / sampling_rate,
+              utterances=len(wavs)):
+        return _embed_utterances(wavs, encoder, batch_size, rate, min_coverage)
+
+
+def _embed_utterances(wavs, encoder, batch_size, rate, min_coverage):
+    sums = None
+    counts = np.zeros(len(wavs), dtype=np.int64)
+    pending, owners = [], []
+
+    def flush():
+        nonlocal sums
+        with torch.no_grad():
+            mels = torch.from_numpy(np.stack(pending)).to(encoder.device)
+            partial_embeds = encoder(mels).cpu().numpy()
+        if sums is None:
+            sums = np.zeros((len(wavs), partial_embeds.shape[1]), dtype=np.float32)
+        np.add.at(sums, owners, partial_embeds)
+        pending.clear()
+        owners.clear()
+
+    for i, wav in enumerate(wavs):
+        wav_slices, mel_slices = encoder.compute_partial_slices(len(wav), rate, min_coverage)
+        max_wave_length = wav_slices[-1].stop
+        if max_wave_length >= len(wav):
+            wav = np.pad(wav, (0, max_wave_length - len(wav)), "constant")
+        mel = audio.wav_to_mel_spectrogram(wav)
+        for s in mel_slices:
+            pending.append(mel[s])
+            owners.append(i)
+            counts[i] += 1
+            if len(pending) >= batch_size:
+                flush()
+    if pending:
+        flush()
+    if sums is None:
+        return np.zeros((0, 256), dtype=np.float32)
 
-    # Загружаем и кодируем эталонный голос
-    encoder = VoiceEncoder()
-    ref_wav = preprocess_wav(reference_path)
-    ref_embed = encoder.embed_utterance(ref_wav)
+    raw_embeds = sums / np.maximum(counts, 1)[:, None]
+    return raw_embeds / np.maximum(np.linalg.norm(raw_embeds, axis=1, keepdims=True), 1e-12)
 
-    # Загружаем основное аудио
-    y, sr = librosa.load(audio_path, sr=sample_rate)
+def cosine_scores(embeds, ref_embed):
+    """Косинусное сходство каждой строки embeds с ref_embed одной матричной операцией."""
+    embeds = np.atleast_2d(embeds)
+    norms = np.linalg.norm(embeds, axis=1) * np.linalg.norm(ref_embed)
+    return embeds @ ref_embed / np.maximum(norms, 1e-12)
 
-    MIN_DURATION = 1.0  # в секундах
+def speaker_centroids(y, sr, mono_segments, encoder, min_duration=1.0):
+    """
+    Средние эмбеддинги спикеров по их одиночным сегментам.
 
-    speaker_embeddings = {}
+    :param min_duration: более короткие сегменты не учитываются, сек
+    :return: (список меток, массив центроидов (len(labels), 256))
+    """
+    wavs, speakers = [], []
     for start, end, speaker in mono_segments:
-        if end - start < MIN_DURATION:
+        if end - start < min_duration:
             continue
 
         segment_audio = y[int(start * sr):int(end * sr)]
         try:
-            wav = preprocess_wav(segment_audio, source_sr=sr)
-            embed = encoder.embed_utterance(wav)
-            speaker_embeddings.setdefault(speaker, []).append(embed)
+            wavs.append(preprocess_wav(segment_audio, source_sr=sr))
+            speakers.append(speaker)
         except Exception as e:
             print(f"Ошибка сегмента {start:.2f}-{end:.2f}: {e}")
 
-    # Усредняем эмбеддинги и сравниваем
-    mean_embeddings = {s: np.mean(np.vstack(e), axis=0) for s, e in speaker_embeddings.items()}
-    similarities = {s: cosine_similarity(ref_embed.reshape(1, -1), emb.reshape(1, -1))[0][0] for s, emb in mean_embeddings.items()}
+    # Эмбеддинги всех сегментов считаются пачками
+    embeds = embed_utterances(wavs, encoder)
+    speakers = np.array(speakers)
+    labels = list(dict.fromkeys(speakers.tolist()))
+    centroids = np.array([embeds[speakers == s].mean(axis=0) for s in labels])
+    return labels, centroids
+
+def identify_target_speaker(reference_path, audio_path, mono_segments, sample_rate=16000, ref_embed=None):
+    """
+    Определяет, кто из спикеров диаризации — владелец эталонного голоса.
+
+    :param audio_path: путь к записи или AudioBuffer (тогда файл не декодируется заново)
+    :param ref_embed: готовый эмбеддинг эталона (тогда reference_path не читается)
+    :return: (target_speaker, ref_embed, y, sr, encoder)
+    """
+    print("🔜 Определение целевого спикера...")
+
+    # Эмбеддинг эталонного голоса берём из кэша (считается один раз на файл)
+    encoder = get_voice_encoder()
+    if ref_embed is None:
+        ref_embed = get_reference_embedding(reference_path, encoder)
+
+    # Основное аудио на нужной частоте
+    if not isinstance(audio_path, AudioBuffer):
+        audio_path = AudioBuffer.from_file(audio_path)
+    y, sr = audio_path.get(sample_rate), sample_rate
+
+    # Центроиды спикеров и сходство с эталоном одной матричной операцией
+    labels, centroids = speaker_centroids(y, sr, mono_segments, encoder)
+    scores = cosine_scores(centroids, ref_embed) if labels else []
+    similarities = {s: float(sim) for s, sim in zip(labels, scores)}
 
     print("\n Сходство спикеров с эталоном:")
     for s, sim in sorted(similarities.items(), key=lambda x: x[1], reverse=True):
@@ -54,12 +139,12 @@ def identify_target_speaker(reference_path, audio_path, mono_segments, sample_ra
     return target, ref_embed, y, sr, encoder
 
 def get_encoder():
-    return VoiceEncoder()
+    return get_voice_encoder()
 
 def extract_embedding(audio_path, encoder, sample_rate=16000):
     """
     Возвращает эмбеддинг аудиофайла с помощью переданного encoder.
     """
-    wav = preprocess_wav(audio_path)
+    wav = preprocess_wav(load_audio(audio_path, sample_rate), source_sr=sample_rate)
     return encoder.embed_utterance(wav)
 
@@ -0,0 +1,195 @@
+# models/streaming.py
+
+import os
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from models.asr import transcribe_audio
+from models.audio_buffer import AudioBuffer
+from models.combine import combine_segments
+from models.diarization import run_diarization
+from models.embedding_store import get_reference_embedding
+from models.registry import get_voice_encoder
+from models.separation import run_separation
+from models.speaker_id import cosine_scores, speaker_centroids
+
+SAMPLE_RATE = 16000
+
+
+def check_windows(window_sec, overlap_sec):
+    """
+    :raises ValueError: окно не положительное, перекрытие отрицательное или не короче окна
+    """
+    if window_sec <= 0:
+        raise ValueError(f"Длина окна должна быть больше нуля: {window_sec}")
+    if overlap_sec < 0 or overlap_sec >= window_sec:
+        raise ValueError(f"Перекрытие должно быть от 0 до длины окна ({window_sec} сек): {overlap_sec}")
+
+
+def iter_windows(audio_path, window_sec=600.0, overlap_sec=30.0):
+    """
+    Читает запись окнами с перекрытием, не загружая её целиком.
+
+    :return: генератор (номер окна, начало окна в сек, AudioBuffer окна, последнее ли окно)
+    """
+    check_windows(window_sec, overlap_sec)
+    with sf.SoundFile(str(audio_path)) as f:
+        sr = f.samplerate
+        window = int(window_sec * sr)
+        hop = int((window_sec - overlap_sec) * sr)
+        if hop <= 0:
+            raise ValueError(f"Шаг окна меньше одного отсчёта: окно {window_sec}, перекрытие {overlap_sec} сек")
+        start, idx = 0, 0
+        while True:
+            f.seek(start)
+            block = f.read(window, dtype="float32", always_2d=True).mean(axis=1)
+            is_last = start + window >= f.frames
+            yield idx, start / sr, AudioBuffer(block, sr), is_last
+            if is_last:
+                return
+            start += hop
+            idx += 1
+
+
+class SpeakerLinker:
+    """
+    Сопоставляет метки спикеров разных окон по эмбеддингам, чтобы один и тот же
+    человек получал одну глобальную метку на всей записи.
+    """
+
+    def __init__(self, threshold=0.75):
+        self.threshold = threshold
+        self.labels = []
+        self._sums = []
+        self._counts = []
+
+    def centroids(self):
+        return np.array([s / c for s, c in zip(self._sums, self._counts)])
+
+    def link(self, labels, centroids):
+        """
+        :param labels: локальные метки окна
+        :param centroids: их центроиды
+        :return: {локальная метка: глобальная метка}
+        """
+        mapping, taken = {}, set()
+        for label, centroid in zip(labels, centroids):
+            best = -1
+            if self.labels:
+                scores = cosine_scores(self.centroids(), centroid)
+                scores[list(taken)] = -1  # два спикера окна не могут быть одним человеком
+                best = int(np.argmax(scores))
+                if scores[best] < self.threshold:
+                    best = -1
+            if best < 0:
+                best = len(self.labels)
+                self.labels.append(f"SPEAKER_G{best:02d}")
+                self._sums.append(np.zeros_like(centroid))
+                self._counts.append(0)
+            self._sums[best] = self._sums[best] + centroid
+            self._counts[best] += 1
+            mapping[label] = self.labels[best]
+            taken.add(best)
+        return mapping
+
+    def match(self, ref_embed, threshold=0.5):
+        """Глобальная метка, наиболее похожая на эталон, или None."""
+        if not self.labels:
+            return None
+        scores = cosine_scores(self.centroids(), ref_embed)
+        best = int(np.argmax(scores))
+        return self.labels[best] if scores[best] >= threshold else None
+
+
+def _clip_segments(segments, lo, hi, relabel):
+    """Обрезает сегменты окна по его «ядру» [lo, hi) и переводит метки в глобальные."""
+    clipped = []
+    for start, end, who in segments:
+        start, end = max(start, lo), min(end, hi)
+        if end > start:
+            clipped.append((start, end, relabel(who)))
+    return clipped
+
+
+def run_streaming(audio_path, reference_path, transcript_path, audio_output_path=None,
+                  window_sec=600.0, overlap_sec=30.0, asr_model_size="small", ref_embed=None):
+    """
+    Обрабатывает длинную запись окнами с перекрытием: диаризация, выделение
+    целевого спикера и ASR идут по окну, очищенный звук и текст дописываются
+    в файлы по мере готовности. Пиковая память определяется длиной окна,
+    а не записи.
+
+    Каждое окно отвечает только за своё «ядро» — часть без половин перекрытий
+    с соседями, поэтому фрагменты на стыках не дублируются.
+
+    :param transcript_path: куда дописывать расшифровку
+    :param audio_output_path: куда дописывать очищенный WAV (None — не сохранять)
+    :param ref_embed: готовый эмбеддинг эталона (тогда reference_path не читается)
+    :return: (полный текст, путь к WAV или None, глобальная метка целевого спикера)
+    """
+    check_windows(window_sec, overlap_sec)
+    encoder = get_voice_encoder()
+    if ref_embed is None:
+        ref_embed = get_reference_embedding(str(reference_path), encoder)
+    linker = SpeakerLinker()
+    target_speaker = "NOT_FOUND"
+    texts = []
+
+    writer = None
+    if audio_output_path is not None:
+        os.makedirs(Path(audio_output_path).parent, exist_ok=True)
+        writer = sf.SoundFile(str(audio_output_path), "w", samplerate=SAMPLE_RATE, channels=1)
+
+    try:
+        with open(transcript_path, "w", encoding="utf-8") as transcript_file:
+            for idx, offset, buffer, is_last in iter_windows(audio_path, window_sec, overlap_sec):
+                print(f"\n🪟 Окно {idx}: {offset:.0f}–{offset + buffer.duration:.0f} сек")
+                mono_segments, multi_segments, _ = run_diarization(buffer)
+                y = buffer.get(SAMPLE_RATE)
+
+                labels, centroids = speaker_centroids(y, SAMPLE_RATE, mono_segments, encoder)
+                mapping = linker.link(labels, centroids)
+
+                def relabel(who):
+                    if isinstance(who, str):
+                        return mapping.get(who, f"{who}@{idx}")
+                    return [mapping.get(w, f"{w}@{idx}") for w in who]
+
+                lo = overlap_sec / 2 if idx > 0 else 0.0
+                hi = buffer.duration if is_last else buffer.duration - overlap_sec / 2
+                mono_segments = _clip_segments(mono_segments, lo, hi, relabel)
+                multi_segments = _clip_segments(multi_segments, lo, hi, relabel)
+
+                target = linker.match(ref_embed)
+                if target is None:
+                    print("⚠️ Целевой спикер в окне не найден.")
+                    continue
+                target_speaker = target
+
+                target_segments = run_separation(
+                    y=buffer,
+                    sr=SAMPLE_RATE,
+                    multi_segments=multi_segments,
+                    target_speaker=target,
+                    ref_embed=ref_embed,
+                    encoder=encoder
+                )
+                if not target_segments and all(s != target for _, _, s in mono_segments):
+                    continue
+
+                chunk = combine_segments(mono_segments, target_segments, target, y, SAMPLE_RATE)
+                if writer is not None:
+                    writer.write(chunk)
+                    writer.flush()
+
+                text = transcribe_audio(chunk, model_size=asr_model_size).strip()
+                transcript_file.write(text + "\n")
+                transcript_file.flush()
+                texts.append(text)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return " ".join(texts), audio_output_path, target_speaker
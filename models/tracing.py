@@ -0,0 +1,192 @@
+# models/tracing.py
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def rss_mb():
+    """Текущий RSS процесса в МБ (0.0, если платформа не даёт его узнать)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса с момента запуска в МБ."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+class Tracer:
+    """
+    Сборщик интервалов (span) выполнения: этапы, загрузка моделей,
+    инференс, HTTP-запросы.
+
+    Для каждого интервала пишутся время, процессорное время, RSS и
+    длительность обработанного аудио (для расчёта real-time factor).
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t0 = time.perf_counter()
+        self.started_at = time.time()
+
+    @contextmanager
+    def span(self, name, category="stage", audio_seconds=None, **args):
+        """
+        :param category: "stage", "model_load", "inference", "http", ...
+        :param audio_seconds: сколько секунд аудио обрабатывается
+        :param args: дополнительные поля; словарь можно дополнять внутри блока
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {"name": name, "category": category, "audio_seconds": audio_seconds, "args": args,
+                  "parent": stack[-1]["name"] if stack else None}
+        stack.append(record)
+
+        start = time.perf_counter()
+        thread_cpu = time.thread_time()
+        process_cpu = time.process_time()
+        error = None
+        try:
+            yield record
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            wall = time.perf_counter() - start
+            record.update(
+                start=start - self._t0,
+                wall_s=wall,
+                # в cpu_s попадают и потоки torch, и параллельные задачи того же процесса
+                thread_cpu_s=time.thread_time() - thread_cpu,
+                cpu_s=time.process_time() - process_cpu,
+                rss_mb=rss_mb(),
+                peak_rss_mb=peak_rss_mb(),
+                thread=threading.current_thread().name,
+                tid=threading.get_ident(),
+            )
+            if record["audio_seconds"]:
+                record["rtf"] = wall / record["audio_seconds"]
+            if error:
+                record["error"] = error
+            with self._lock:
+                self.events.append(record)
+
+    def summary(self):
+        """
+        Сводка по именам интервалов.
+
+        :return: {имя: {"count", "wall_s", "cpu_s", "audio_seconds", "rtf"}}
+        """
+        totals = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            row = totals.setdefault(event["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "audio_seconds": 0.0})
+            row["count"] += 1
+            row["wall_s"] += event["wall_s"]
+            row["cpu_s"] += event["cpu_s"]
+            row["audio_seconds"] += event["audio_seconds"] or 0.0
+        for row in totals.values():
+            row["rtf"] = row["wall_s"] / row["audio_seconds"] if row["audio_seconds"] else None
+        return totals
+
+    def print_summary(self):
+        print("🔬 Трассировка:")
+        for name, row in self.summary().items():
+            rtf = f", RTF {row['rtf']:.3f}" if row["rtf"] is not None else ""
+            print(f"• {name} ×{row['count']}: {row['wall_s']:.2f} сек, CPU {row['cpu_s']:.2f} сек{rtf}")
+
+    def write_jsonl(self, path):
+        """Одна строка JSON на интервал, в порядке завершения."""
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps({"pid": os.getpid(), **event}, ensure_ascii=False, default=str) + "\n")
+
+    def write_chrome_trace(self, path):
+        """Формат Chrome Trace Event (chrome://tracing, Perfetto)."""
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = []
+        for event in events:
+            args = {k: v for k, v in event.items()
+                    if k not in ("name", "category", "start", "wall_s", "tid", "args")}
+            args.update(event["args"])
+            trace.append({
+                "name": event["name"], "cat": event["category"], "ph": "X",
+                "ts": event["start"] * 1e6, "dur": event["wall_s"] * 1e6,
+                "pid": pid, "tid": event["tid"], "args": args,
+            })
+            trace.append({"name": "RSS", "ph": "C", "ts": (event["start"] + event["wall_s"]) * 1e6,
+                          "pid": pid, "args": {"rss_mb": event["rss_mb"]}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+    def export(self, prefix):
+        """
+        Сохраняет <prefix>.jsonl и <prefix>.chrome.json.
+
+        :return: пути к обоим файлам
+        """
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        jsonl_path = prefix.with_name(prefix.name + ".jsonl")
+        chrome_path = prefix.with_name(prefix.name + ".chrome.json")
+        self.write_jsonl(jsonl_path)
+        self.write_chrome_trace(chrome_path)
+        return jsonl_path, chrome_path
+
+
+_tracer = None
+
+
+def start_tracing():
+    """Включает трассировку в процессе и возвращает новый Tracer."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing():
+    """Выключает трассировку и возвращает собранный Tracer (или None)."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def span(name, category="stage", audio_seconds=None, **args):
+    """
+    Интервал в активном Tracer; без включённой трассировки почти ничего не стоит.
+
+    Внутри блока возвращается словарь, в который можно дописать
+    audio_seconds или поля args, известные только после работы.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield {"args": args, "audio_seconds": audio_seconds}
+        return
+    with tracer.span(name, category, audio_seconds, **args) as record:
+        yield record
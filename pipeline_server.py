@@ -0,0 +1,377 @@
+"""
+Резидентный режим пайплайна: модели загружаются один раз при старте,
+задания принимаются по локальному HTTP (TCP или Unix-сокет).
+
+    python pipeline_server.py --port 8765
+    python pipeline_server.py --socket /tmp/speech.sock
+
+    POST /jobs               {"input": "...", "reference": "..." | "reference_id": "...", "stages": "..."}
+    GET  /jobs/<id>          статус и пути к результатам
+    GET  /jobs/<id>/events   ход этапов (NDJSON, поток до завершения задания)
+    POST /references         {"path": "..."} → {"reference_id": "..."}
+    GET  /health
+"""
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from models import registry
+from models.resources import apply_plan, plan_resources
+from run_pipeline import ASR_MODEL_SIZE, ENTRY_STAGES, PIPELINE_STAGES, STAGE_NAMES, main, parse_stages, stage_models
+
+# какие поля POST /jobs передаются в main как есть
+JOB_OPTIONS = ("asr_mode", "language", "save_audio", "debug", "stream", "use_cache", "force_stages")
+
+
+class Job:
+    """Задание сервера: параметры, статус и журнал событий для /events."""
+
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.events = []
+        self._changed = threading.Condition()
+        self._finished = False
+        self.emit("queued")
+
+    @property
+    def finished(self):
+        """Событие finished (с путями к результатам) уже записано в журнал."""
+        return self._finished
+
+    def emit(self, event, **fields):
+        with self._changed:
+            self.events.append({"job": self.id, "event": event, "time": time.time(), **fields})
+            if event == "finished":
+                self._finished = True
+            self._changed.notify_all()
+
+    def on_task(self, task, event, elapsed):
+        """Обработчик TaskGraph: каждое начало и окончание задачи пайплайна попадает в журнал."""
+        self.emit(f"task_{event}", task=task, stage=STAGE_NAMES.get(task, task), elapsed=round(elapsed, 3))
+
+    def wait_events(self, since, timeout=15.0):
+        """
+        Ждёт событий с номера since.
+
+        :return: (новые события, задание завершено)
+        """
+        with self._changed:
+            if len(self.events) <= since and not self.finished:
+                self._changed.wait(timeout)
+            return self.events[since:], self.finished
+
+    def to_dict(self):
+        return {"id": self.id, "status": self.status, "created": self.created, "params": self.params,
+                "result": self.result, "error": self.error}
+
+
+class PipelineService:
+    """
+    Очередь заданий с ограниченной длиной и фиксированным числом
+    потоков-исполнителей. Все задания используют модели из общего реестра.
+    """
+
+    def __init__(self, output_dir, concurrency=1, queue_size=16, history=1000, stages=PIPELINE_STAGES,
+                 cpu_plan=None):
+        """
+        :param output_dir: результаты задания пишутся в <output_dir>/<id задания>
+        :param concurrency: сколько заданий выполняется одновременно (с cpu_plan — верхняя граница)
+        :param queue_size: сколько заданий может ждать в очереди (дальше — отказ 503)
+        :param history: сколько завершённых заданий хранить для /jobs/<id>
+        :param stages: этапы по умолчанию для заданий без поля stages
+        :param cpu_plan: "auto", "throughput" или "latency" — число одновременных заданий и потоков
+                         на задание выбирается один раз при старте по числу ядер и ёмкости очереди
+                         queue_size (concurrency — верхняя граница); None — ровно concurrency
+        """
+        # потоки torch делятся между одновременными заданиями, иначе каждое занимает все ядра.
+        # План не меняется на ходу: потоки torch общие для процесса, а задания — его потоки
+        if cpu_plan:
+            self.plan = plan_resources(queue_size, mode=cpu_plan, max_workers=concurrency)
+        else:
+            self.plan = plan_resources(concurrency, workers=concurrency)
+        concurrency = self.plan.workers
+        self.output_dir = Path(output_dir)
+        self.stages = parse_stages(stages)
+        self.history = history
+        self.jobs = OrderedDict()
+        self.running = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                         for i in range(concurrency)]
+
+    def start(self, warmup=True):
+        # задания — потоки одного процесса: привязка к ядрам общая, делятся только потоки torch
+        apply_plan(self.plan, pin=False)
+        print(f"🧮 Ресурсы: {self.plan.describe()}")
+        if warmup:
+            print("🔥 Загрузка моделей...")
+            registry.warmup(whisper_size=ASR_MODEL_SIZE, kinds=stage_models(self.stages))
+            registry.print_model_stats()
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _validate(self, payload):
+        stages = parse_stages(payload.get("stages") or self.stages)
+        entry = ENTRY_STAGES[stages[0]]
+        source = payload.get("input") or payload.get("transcript")
+        if not source:
+            raise ValueError("Не указан input (или transcript)")
+        if not Path(source).is_file():
+            raise ValueError(f"Файл не найден: {source}")
+        if entry == "transcript" and payload.get("input") and not payload.get("transcript"):
+            payload = {**payload, "transcript": payload["input"]}
+        if stages[0] == "diarization":
+            if not payload.get("reference") and not payload.get("reference_id"):
+                raise ValueError("Для диаризации нужен reference или reference_id")
+            if payload.get("reference") and not Path(payload["reference"]).is_file():
+                raise ValueError(f"Файл не найден: {payload['reference']}")
+        unknown = set(payload) - {"input", "transcript", "reference", "reference_id", "stages", "name", *JOB_OPTIONS}
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+        return {**payload, "stages": ",".join(stages)}
+
+    def submit(self, payload):
+        """
+        Ставит задание в очередь.
+
+        :raises ValueError: некорректные параметры
+        :raises queue.Full: очередь заполнена
+        """
+        job = Job(self._validate(payload))
+        self._queue.put_nowait(job)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        return job
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self.running += 1
+            job.status = "running"
+            job.emit("started")
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                job.emit("finished", status=job.status, result=job.result, error=job.error)
+
+    def _run(self, job):
+        params = job.params
+        options = {key: params[key] for key in JOB_OPTIONS if key in params}
+        try:
+            job.result = main(
+                audio_path=params.get("input"),
+                reference_path=params.get("reference"),
+                reference_id=params.get("reference_id"),
+                transcript_input=params.get("transcript"),
+                output_dir=self.output_dir / job.id,
+                name=params.get("name") or Path(params.get("transcript") or params["input"]).stem,
+                stages=params["stages"],
+                progress=job.on_task,
+                **options
+            )
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "error"
+            print(f"❌ Задание {job.id}: {job.error}")
+
+    def add_reference(self, path):
+        """
+        Считает (или берёт из кэша) эмбеддинг эталона.
+
+        :return: id эмбеддинга для поля reference_id заданий
+        """
+        from models.embedding_store import get_store
+        if not Path(path).is_file():
+            raise ValueError(f"Файл не найден: {path}")
+        reference_id, _ = get_store().get_or_compute(str(path), registry.get_voice_encoder())
+        return reference_id
+
+    def health(self):
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+            running = self.running
+        return {
+            "status": "ok",
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "running": running,
+            "concurrency": len(self._workers),
+            "jobs": {status: statuses.count(status) for status in set(statuses)},
+            "models": [kind for kind, *_ in registry.model_stats()],
+        }
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0: конец потока событий — закрытие соединения
+    protocol_version = "HTTP/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(payload, dict):
+            raise ValueError("Ожидается JSON-объект")
+        return payload
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["health"]:
+            return self._send_json(200, self.service.health())
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": f"Задание {parts[1]} не найдено"})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == "events":
+                since = int(parse_qs(url.query).get("since", ["0"])[0])
+                return self._stream_events(job, since)
+        self._send_json(404, {"error": f"Нет такого адреса: {url.path}"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        try:
+            payload = self._read_json()
+            if path == "/jobs":
+                job = self.service.submit(payload)
+                return self._send_json(202, {"id": job.id, "status": job.status,
+                                             "events": f"/jobs/{job.id}/events"})
+            if path == "/references":
+                return self._send_json(200, {"reference_id": self.service.add_reference(payload.get("path", ""))})
+        except queue.Full:
+            return self._send_json(503, {"error": "Очередь заданий заполнена"})
+        except ValueError as e:  # в т.ч. json.JSONDecodeError
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(404, {"error": f"Нет такого адреса: {path}"})
+
+    def _stream_events(self, job, since):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                events, finished = job.wait_events(since)
+                for event in events:
+                    self.wfile.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                since += len(events)
+                if finished and not events:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        # BaseHTTPRequestHandler ждёт от сервера имя и порт
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(service, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    :param socket_path: путь Unix-сокета (тогда host и port не используются)
+    :return: HTTP-сервер с service в атрибуте service
+    """
+    if socket_path:
+        server = UnixHTTPServer(str(socket_path), JobRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), JobRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speech Feedback Pipeline server")
+    parser.add_argument("--host", default="127.0.0.1", help="Listen address (localhost only by default)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--output", default="data/output/server", help="Output directory for job results")
+    parser.add_argument("--concurrency", type=int, help="Jobs processed at the same time "
+                                                         "(default 1; upper bound with --cpu-plan)")
+    parser.add_argument("--cpu-plan", choices=("auto", "throughput", "latency"),
+                        help="Choose concurrency and per-job torch threads once at startup from the core count "
+                             "and --queue-size (capacity, not the current queue length)")
+    parser.add_argument("--queue-size", type=int, default=16, help="Jobs waiting in the queue before 503")
+    parser.add_argument("--precision", choices=("fp32", "int8"),
+                        help="int8: dynamic quantisation of Whisper and Sepformer linear layers on CPU")
+    parser.add_argument("--stages", default=",".join(PIPELINE_STAGES),
+                        help="Default stages for jobs; models for them are loaded at startup")
+    args = parser.parse_args()
+    if args.precision:
+        os.environ["SPEECH_ANREC_PRECISION"] = args.precision
+
+    warnings.filterwarnings("ignore")
+    service = PipelineService(args.output, concurrency=args.concurrency or (None if args.cpu_plan else 1),
+                              queue_size=args.queue_size, stages=args.stages, cpu_plan=args.cpu_plan)
+    service.start()
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"🚀 Сервер запущен: {args.socket or f'http://{args.host}:{server.server_port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Остановка сервера...")
+    finally:
+        server.server_close()
+        service.stop()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
@@ -1,123 +1,635 @@
 import argparse
+import csv
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import time
 from dotenv import load_dotenv
 import os
 import warnings
 
-from models.diarization import run_diarization
-from models.speaker_id import identify_target_speaker
-from models.separation import run_separation
-from models.combine import combine_segments
-from models.asr import transcribe_audio
-from models.analysis import analyze_transcript, save_report
-from models.feedback import generate_feedback
-from models.speaker_extraction import extract_target_speaker
+# Модули этапов (torch, pyannote, speechbrain, whisper, ...) импортируются в main
+# только для выбранных этапов: --help и анализ готовой расшифровки стартуют быстро
+from models.registry import (DEFAULT_DIARIZATION_MODEL, DEFAULT_SEPARATION_MODEL, default_precision, get_sepformer,
+                             get_voice_encoder, get_whisper, print_model_stats, warmup)
+from models.cache import hash_bytes, hash_file
+from models.checkpoints import STAGES, StageCache
+from models.resources import apply_plan, budgeted, plan_resources
+from models.scheduler import TaskGraph
+from models.tracing import span, start_tracing, stop_tracing
 
 load_dotenv()
 
 hf_token = os.getenv("HF_TOKEN")
 openrouter_key = os.getenv("OPENROUTER_API_KEY")
 
+ASR_MODEL_SIZE = "small"
+SAMPLE_RATE = 16000
 
-def main(audio_path, reference_path, output_dir, debug=False):
+PIPELINE_STAGES = ("diarization", "separation", "combine", "asr", "analysis", "feedback")
+# этапы, с которых можно начать, и их вход
+ENTRY_STAGES = {"diarization": "audio", "asr": "audio", "analysis": "transcript"}
+
+STAGE_NAMES = {
+    "input_hash": "Хеш входной записи",
+    "reference_hash": "Хеш эталона",
+    "decode": "Декодирование аудио",
+    "load_transcript": "Чтение расшифровки",
+    "wav_input": "Подготовка WAV для ASR",
+    "reference_embedding": "Эмбеддинг эталона",
+    "load_sepformer": "Загрузка Sepformer",
+    "load_whisper": "Загрузка Whisper",
+    "diarization": "Диаризация",
+    "separation": "Идентификация и разделение",
+    "combine": "Объединение фрагментов",
+    "stream": "Потоковая обработка (диаризация → ASR)",
+    "asr": "Распознавание речи (ASR)",
+    "analysis": "Анализ речи",
+    "feedback": "AI-рекомендации (LLM)",
+}
+
+
+def model_tag(name, kind):
+    """Имя модели для ключа кэша этапа: у int8-варианта — с суффиксом, fp32-ключи не меняются."""
+    precision = default_precision(kind)
+    return name if precision == "fp32" else f"{name}:{precision}"
+
+
+def parse_stages(value):
+    """
+    Проверяет набор этапов для --stages.
+
+    Этапы должны идти подряд в порядке PIPELINE_STAGES и начинаться с этапа,
+    для которого есть вход: diarization (запись + эталон), asr (WAV с речью
+    целевого спикера) или analysis (готовая расшифровка).
+
+    :param value: строка "asr,analysis,feedback" или последовательность имён
+    :return: кортеж этапов в порядке пайплайна
+    """
+    names = [s.strip() for s in value.split(",")] if isinstance(value, str) else list(value)
+    unknown = [s for s in names if s not in PIPELINE_STAGES]
+    if unknown or not names:
+        raise ValueError(f"Неизвестные этапы: {', '.join(unknown) or '(пусто)'}; "
+                         f"доступны: {', '.join(PIPELINE_STAGES)}")
+    selected = tuple(s for s in PIPELINE_STAGES if s in names)
+    first = PIPELINE_STAGES.index(selected[0])
+    if selected != PIPELINE_STAGES[first:first + len(selected)]:
+        raise ValueError(f"Этапы должны идти подряд: {', '.join(selected)}")
+    if selected[0] not in ENTRY_STAGES:
+        raise ValueError(f"Нельзя начать с этапа {selected[0]}: начните с одного из {', '.join(ENTRY_STAGES)}")
+    return selected
+
+
+def main(audio_path, reference_path, output_dir, debug=False, name=None, save_audio=False,
+         stream=False, window_sec=600.0, overlap_sec=30.0,
+         use_cache=True, cache_dir=None, force_stages=(), asr_mode="segments", language="ru",
+         trace=None, stages=PIPELINE_STAGES, transcript_input=None, reference_id=None, progress=None):
+    """
+    Обрабатывает одну запись. Аудио передаётся между этапами в памяти.
+
+    Этапы выполняются планировщиком TaskGraph: загрузка моделей, эмбеддинг
+    эталона и декодирование идут параллельно с диаризацией. Модули этапов
+    импортируются только для выбранных этапов.
+
+    :param audio_path: запись (для stages с diarization) или WAV с речью целевого спикера (с asr)
+    :param reference_path: эталон целевого спикера (нужен, только если выбрана diarization)
+    :param name: имя результатов (по умолчанию — имя входного файла в режиме debug)
+    :param save_audio: дополнительно сохранить очищенный WAV
+    :param stream: обрабатывать запись окнами window_sec с перекрытием overlap_sec
+    :param use_cache: пропускать этапы, результат которых уже есть в кэше
+    :param force_stages: этапы, которые нужно пересчитать независимо от кэша
+    :param asr_mode: "segments" — распознавать фрагменты целевого спикера пачками окон
+                     с временными метками, "full" — всю склейку одним вызовом Whisper
+    :param language: язык распознавания в режиме segments
+    :param trace: префикс файлов трассировки (<trace>.jsonl и <trace>.chrome.json); None — без трассировки
+    :param stages: выполняемые этапы (см. parse_stages)
+    :param transcript_input: готовая расшифровка (.txt), если этапы начинаются с analysis
+    :param reference_id: id сохранённого эмбеддинга эталона (EmbeddingStore) вместо reference_path
+    :param progress: функция (задача, событие, секунды) для отслеживания хода этапов
+    :return: словарь с целевым спикером, путями к результатам и временем этапов
+    """
     warnings.filterwarnings("ignore")
-    timings = {}
+    stages = parse_stages(stages)
+    entry = ENTRY_STAGES[stages[0]]
+
+    if entry == "transcript":
+        source_path = Path(transcript_input or audio_path)
+    else:
+        source_path = Path(audio_path)
+        if stages[0] == "diarization" and reference_path is None and reference_id is None:
+            raise ValueError("Для диаризации и разделения нужен эталон (reference_path или reference_id)")
+    if stream and not {"diarization", "asr"} <= set(stages):
+        raise ValueError("Потоковый режим выполняет этапы diarization…asr целиком")
+    if stream:
+        from models.streaming import check_windows
+        check_windows(window_sec, overlap_sec)
 
-    audio_path = Path(audio_path)
-    basename = Path(audio_path).stem if debug else ""
-    suffix = f"{basename}" if debug else ""
+    basename = source_path.stem if debug else ""
+    suffix = name or (f"{basename}" if debug else "")
 
-    reference_path = Path(reference_path)
-    initial_output_dir = Path(output_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True, parents=True)
+    for subdir in ("transcript", "analysis_report", "feedback"):
+        os.makedirs(output_dir / subdir, exist_ok=True)
+    transcript_path = output_dir / "transcript" / f"{suffix}.txt"
+    segments_path = output_dir / "transcript" / f"{suffix}.segments.json"
+    report_path = output_dir / "analysis_report" / f"{suffix}.md"
+    ai_feedback_path = output_dir / "feedback" / f"{suffix}.md"
+    combined_audio_path = None
+    if (save_audio or debug) and "combine" in stages:
+        os.makedirs(output_dir / "target_speaker_combined", exist_ok=True)
+        combined_audio_path = output_dir / "target_speaker_combined" / f"{suffix}.wav"
+    if entry == "transcript":
+        transcript_path = source_path
 
     print("🟢 Старт обработки...\n")
     start_time = time.time()
 
-    # 1. Диаризация
-    t0 = time.time()
-    mono_segments, multi_segments, _ = run_diarization(str(audio_path))
-    timings["Диаризация"] = time.time() - t0
-
-    # 2–4. Извлечение целевого спикера
-    t0 = time.time()
-    combined_audio_path, target_speaker = extract_target_speaker(
-        reference_path=str(reference_path),
-        audio_path=str(audio_path),
-        mono_segments=mono_segments,
-        multi_segments=multi_segments,
-        output_dir=output_dir,
-        debug=debug
-    )
-    timings["Извлечение целевого спикера"] = time.time() - t0
-
-    # 5. ASR
-    t0 = time.time()
-    transcript = transcribe_audio(str(combined_audio_path), model_size="small")
-    os.makedirs(initial_output_dir / "transcript", exist_ok=True)
-    output_dir = initial_output_dir / "transcript"
-    transcript_path = output_dir / f"{suffix}.txt"
-    with open(transcript_path, "w", encoding="utf-8") as f:
-        f.write(transcript)
-    timings["Распознавание речи (ASR)"] = time.time() - t0
-
-    # 6. Анализ речи
-    t0 = time.time()
-    report = analyze_transcript(transcript)
-    os.makedirs(initial_output_dir / "analysis_report", exist_ok=True)
-    output_dir = initial_output_dir / "analysis_report"
-    report_path = output_dir / f"{suffix}.md"
-    save_report(report, path=str(report_path))
-    timings["Анализ речи"] = time.time() - t0
-
-    # 7. AI-рекомендации
-    t0 = time.time()
-    ai_feedback = generate_feedback(
-        transcribed_text=transcript,
-        total_words=report["metrics"]["Общее количество слов"],
-        unique_words=report["metrics"]["Уникальных слов"],
-        ttr=report["metrics"]["Type-Token Ratio (TTR)"],
-        avg_sentence_length=report["metrics"]["Средняя длина предложения"],
-        filler_counts=report["filler_counts"],
-        api_key=openrouter_key
-    )
-    os.makedirs(initial_output_dir / "feedback", exist_ok=True)
-    output_dir = initial_output_dir / "feedback"
-    ai_feedback_path = output_dir / f"{suffix}.md"
-    with open(ai_feedback_path, "w", encoding="utf-8") as f:
-        f.write(ai_feedback)
-    timings["AI-рекомендации (LLM)"] = time.time() - t0
+    checkpoints = StageCache(cache_dir, force=force_stages, enabled=use_cache)
+    graph = TaskGraph(listener=progress)
+    target_task = None
+    transcript_task = "asr"
+
+    if entry == "transcript":
+        graph.add("load_transcript", lambda: source_path.read_text(encoding="utf-8"))
+        transcript_task = "load_transcript"
+
+    elif stream:
+        from models.embedding_store import get_embedding_by_id
+        from models.streaming import run_streaming
+
+        # 1–5. Потоковая обработка окнами: память не зависит от длины записи
+        def process_stream():
+            transcript, _, target = run_streaming(
+                audio_path=source_path,
+                reference_path=reference_path,
+                ref_embed=get_embedding_by_id(reference_id, get_voice_encoder()) if reference_id else None,
+                transcript_path=transcript_path,
+                audio_output_path=combined_audio_path,
+                window_sec=window_sec,
+                overlap_sec=overlap_sec,
+                asr_model_size=ASR_MODEL_SIZE
+            )
+            return target, transcript
+
+        graph.add("stream", budgeted("stream", process_stream))
+        graph.add("asr", lambda result: result[1], ["stream"])
+        target_task = "stream"
+
+    else:
+        from models.audio_buffer import AudioBuffer
+
+        # Независимые задачи — стартуют сразу и идут параллельно с диаризацией
+        graph.add("input_hash", lambda: hash_file(source_path) if use_cache else None)
+        graph.add("decode", lambda: AudioBuffer.from_file(source_path))
+        if "asr" in stages:
+            graph.add("load_whisper", lambda: get_whisper(ASR_MODEL_SIZE))
+
+    if stages[0] == "diarization" and not stream:
+        from models.diarization import DIARIZATION_VERSION, run_diarization
+
+        # 1. Диаризация
+        def diarize(input_hash, audio):
+            diarization, diarization_hash = checkpoints.run(
+                "diarization", "json",
+                lambda: dict(zip(("mono", "multi"), run_diarization(audio)[:2])),
+                input=input_hash, model=DEFAULT_DIARIZATION_MODEL, version=DIARIZATION_VERSION
+            )
+            mono_segments = [tuple(seg) for seg in diarization["mono"]]
+            multi_segments = [tuple(seg) for seg in diarization["multi"]]
+            return mono_segments, multi_segments, diarization_hash
+
+        graph.add("diarization", budgeted("diarization", diarize), ["input_hash", "decode"])
+
+    if "separation" in stages and not stream:
+        from models.embedding_store import encoder_version, get_embedding_by_id, get_reference_embedding
+        from models.separation import run_separation
+        from models.speaker_id import identify_target_speaker
+
+        if reference_id:
+            # id эмбеддинга — это хеш файла эталона, ключи кэша этапов совпадают
+            graph.add("reference_hash", lambda: reference_id)
+            graph.add("reference_embedding", lambda: get_embedding_by_id(reference_id, get_voice_encoder()))
+        else:
+            reference_path = Path(reference_path)
+            graph.add("reference_hash", lambda: hash_file(reference_path) if use_cache else None)
+            graph.add("reference_embedding", budgeted(
+                "reference_embedding", lambda: get_reference_embedding(str(reference_path), get_voice_encoder())))
+        graph.add("load_sepformer", lambda: get_sepformer())
+
+        # 2–3. Идентификация целевого спикера и разделение перекрытий
+        def separate(diarization, audio, input_hash, reference_hash, ref_embed, _):
+            mono_segments, multi_segments, diarization_hash = diarization
+
+            def compute():
+                target, _, _, sr, encoder = identify_target_speaker(
+                    reference_path=str(reference_path) if reference_path else None,
+                    audio_path=audio,
+                    mono_segments=mono_segments,
+                    sample_rate=SAMPLE_RATE,
+                    ref_embed=ref_embed
+                )
+                return target, run_separation(
+                    y=audio,
+                    sr=sr,
+                    multi_segments=multi_segments,
+                    target_speaker=target,
+                    ref_embed=ref_embed,
+                    encoder=encoder,
+                    output_dir=output_dir / "separated_segments",
+                    debug=debug
+                )
+
+            (target, target_segments), separation_hash = checkpoints.run(
+                "separation", "streams", compute,
+                input=input_hash, diarization=diarization_hash, reference=reference_hash,
+                encoder=encoder_version(get_voice_encoder()), model=model_tag(DEFAULT_SEPARATION_MODEL, "sepformer")
+            )
+            return target, target_segments, separation_hash
+
+        graph.add("separation", budgeted("separation", separate),
+                  ["diarization", "decode", "input_hash", "reference_hash", "reference_embedding",
+                   "load_sepformer"])
+        target_task = "separation"
+
+    if "combine" in stages and not stream:
+        import soundfile as sf
+        from models.combine import combine_segments
+
+        # 4. Объединение фрагментов
+        def combine(diarization, separation, audio, input_hash):
+            mono_segments, _, diarization_hash = diarization
+            target, target_segments, separation_hash = separation
+            (combined_audio, placements), combined_hash = checkpoints.run(
+                "combine", "placed",
+                lambda: combine_segments(mono_segments, target_segments, target,
+                                         audio.get(SAMPLE_RATE), SAMPLE_RATE, return_placements=True),
+                input=input_hash, diarization=diarization_hash, separation=separation_hash
+            )
+            if combined_audio_path is not None:
+                sf.write(combined_audio_path, combined_audio, SAMPLE_RATE)
+            return combined_audio, placements, combined_hash
+
+        graph.add("combine", budgeted("combine", combine), ["diarization", "separation", "decode", "input_hash"])
+
+    if "asr" in stages and not stream:
+        from models.asr import segments_to_text, transcribe_audio, transcribe_segments
 
+        # 5. ASR
+        def transcribe(combined, _):
+            combined_audio, placements, combined_hash = combined
+            # готовый WAV без границ фрагментов распознаётся целиком
+            if asr_mode == "segments" and placements is not None:
+                segments, _ = checkpoints.run(
+                    "asr", "json",
+                    lambda: transcribe_segments(combined_audio, placements, model_size=ASR_MODEL_SIZE,
+                                                language=language, sample_rate=SAMPLE_RATE),
+                    audio=combined_hash, model=model_tag(ASR_MODEL_SIZE, "whisper"), mode=asr_mode, language=language
+                )
+                transcript = segments_to_text(segments)
+                with open(segments_path, "w", encoding="utf-8") as f:
+                    json.dump(segments, f, ensure_ascii=False, indent=2)
+            else:
+                transcript, _ = checkpoints.run(
+                    "asr", "txt",
+                    lambda: transcribe_audio(combined_audio, model_size=ASR_MODEL_SIZE),
+                    audio=combined_hash, model=model_tag(ASR_MODEL_SIZE, "whisper")
+                )
+            with open(transcript_path, "w", encoding="utf-8") as f:
+                f.write(transcript)
+            return transcript
+
+        if "combine" in stages:
+            graph.add("asr", budgeted("asr", transcribe), ["combine", "load_whisper"])
+        else:
+            graph.add("wav_input", lambda audio, input_hash: (audio.get(SAMPLE_RATE), None, input_hash),
+                      ["decode", "input_hash"])
+            graph.add("asr", budgeted("asr", transcribe), ["wav_input", "load_whisper"])
+
+    if "analysis" in stages:
+        from models.analysis import ANALYSIS_VERSION, analyze_transcript, save_report
+
+        # 6. Анализ речи
+        def analyze(transcript):
+            report, _ = checkpoints.run(
+                "analysis", "json", lambda: analyze_transcript(transcript),
+                transcript=hash_bytes(transcript.encode("utf-8")), version=ANALYSIS_VERSION
+            )
+            save_report(report, path=str(report_path))
+            return report
+
+        graph.add("analysis", analyze, [transcript_task])
+
+    if "feedback" in stages:
+        from models.feedback import generate_feedback, get_client
+
+        # 7. AI-рекомендации
+        def feedback(transcript, report):
+            ai_feedback = generate_feedback(
+                transcribed_text=transcript,
+                total_words=report["metrics"]["Общее количество слов"],
+                unique_words=report["metrics"]["Уникальных слов"],
+                ttr=report["metrics"]["Type-Token Ratio (TTR)"],
+                avg_sentence_length=report["metrics"]["Средняя длина предложения"],
+                filler_counts=report["filler_counts"],
+                api_key=openrouter_key,
+                client=get_client(openrouter_key, use_cache=use_cache)
+            )
+            with open(ai_feedback_path, "w", encoding="utf-8") as f:
+                f.write(ai_feedback)
+
+        graph.add("feedback", feedback, [transcript_task, "analysis"])
+
+    tracer = start_tracing() if trace else None
+    try:
+        with span("pipeline", "pipeline", input=str(source_path), stages=",".join(stages)) as record:
+            results = graph.run()
+            record["audio_seconds"] = results["decode"].duration if "decode" in results else None
+    finally:
+        if tracer is not None:
+            stop_tracing()
+    target_speaker = results[target_task][0] if target_task else None
     total_time = time.time() - start_time
+    timings = {STAGE_NAMES.get(task, task): end - start for task, (start, end) in graph.timings.items()}
 
     print("\n✅ Обработка завершена!")
-    print(f"🎯 Target speaker: {target_speaker}")
-    print(f"🎧 Cleaned audio: {combined_audio_path}")
-    print(f"📝 Transcript: {transcript_path}")
-    print(f"📊 Report: {report_path}")
-    print(f"🤖 Feedback: {ai_feedback_path}\n")
+    if target_speaker is not None:
+        print(f"🎯 Target speaker: {target_speaker}")
+    if combined_audio_path:
+        print(f"🎧 Cleaned audio: {combined_audio_path}")
+    if transcript_task in results:
+        print(f"📝 Transcript: {transcript_path}")
+    if "analysis" in stages:
+        print(f"📊 Report: {report_path}")
+    if "feedback" in stages:
+        print(f"🤖 Feedback: {ai_feedback_path}")
+    print()
 
     print("⏱️ Время выполнения:")
     for module, t in timings.items():
         print(f"• {module}: {t:.2f} сек")
+    print("🧭 Критический путь:")
+    for task, start, end in graph.critical_path():
+        print(f"• {STAGE_NAMES.get(task, task)}: {start:.2f} → {end:.2f} сек")
     print(f"🕒 Общее время: {total_time:.2f} сек")
+    print_model_stats()
+    if tracer is not None:
+        tracer.print_summary()
+        jsonl_path, chrome_path = tracer.export(trace)
+        print(f"🔬 Трассировка: {jsonl_path}, {chrome_path}")
+
+    return {
+        "target_speaker": target_speaker,
+        "cleaned_audio": str(combined_audio_path or ""),
+        "transcript": str(transcript_path) if transcript_task in results else "",
+        "report": str(report_path) if "analysis" in stages else "",
+        "feedback": str(ai_feedback_path) if "feedback" in stages else "",
+        "timings": timings,
+        "total_time": total_time,
+    }
+
+
+def collect_jobs(input_dir=None, manifest=None, reference=None, require_reference=True):
+    """
+    Составляет список заданий (input, reference) для пакетного режима.
+
+    :param input_dir: папка с .wav файлами (все сравниваются с reference)
+    :param manifest: CSV с колонками input и (необязательно) reference
+    :param reference: эталон по умолчанию
+    :param require_reference: эталон обязателен (этапы начинаются с диаризации)
+    :return: список пар (input_path, reference_path)
+    """
+    jobs = []
+    if input_dir:
+        jobs += [(str(p), reference) for p in sorted(Path(input_dir).glob("*.wav"))]
+    if manifest:
+        with open(manifest, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                jobs.append((row["input"], row.get("reference") or reference))
+
+    missing = [audio for audio, ref in jobs if not ref]
+    if missing and require_reference:
+        raise ValueError(f"Не указан эталон для: {', '.join(missing)}")
+    return jobs
+
+
+def stage_models(stages):
+    """Модели реестра, нужные выбранным этапам."""
+    kinds = []
+    if "diarization" in stages:
+        kinds.append("pyannote")
+    if "separation" in stages:
+        kinds += ["resemblyzer", "sepformer"]
+    if "asr" in stages:
+        kinds.append("whisper")
+    return kinds
+
+
+def _init_worker(stages=PIPELINE_STAGES, plan=None, counter=None):
+    """
+    :param plan: ResourcePlan — потоки torch и набор ядер воркера
+    :param counter: общий счётчик процессов, по нему воркер выбирает свой набор ядер
+    """
+    warnings.filterwarnings("ignore")
+    if plan is not None:
+        index = 0
+        if counter is not None:
+            with counter.get_lock():
+                index = counter.value
+                counter.value += 1
+        apply_plan(plan, index)
+    warmup(whisper_size=ASR_MODEL_SIZE, kinds=stage_models(stages))
+
+
+def _run_job(audio_path, reference_path, output_dir, debug, save_audio, trace=False, stages=PIPELINE_STAGES,
+             **options):
+    """:param options: остальные параметры main (stream, window_sec, ...)"""
+    name = Path(audio_path).stem
+    try:
+        result = main(audio_path, reference_path, Path(output_dir) / name, debug=debug, name=name,
+                      save_audio=save_audio, trace=Path(output_dir) / name / "trace" if trace else None,
+                      stages=stages, **options)
+        result["status"] = "ok"
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}", "timings": {}}
+    result.update(input=audio_path, reference=reference_path)
+    return result
+
+
+def write_summary(results, path):
+    stages = []
+    for r in results:
+        stages += [s for s in r["timings"] if s not in stages]
+    fields = ["input", "reference", "status", "target_speaker", "cleaned_audio", "transcript",
+              "report", "feedback"] + stages + ["total_time", "error"]
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for r in results:
+            row = {**r, **{s: f"{t:.2f}" for s, t in r["timings"].items()}}
+            if "total_time" in r:
+                row["total_time"] = f"{r['total_time']:.2f}"
+            writer.writerow(row)
+
+
+def run_batch(jobs, output_dir, workers=None, debug=False, save_audio=False, trace=False, stages=PIPELINE_STAGES,
+              cpu_plan=None, stream=False, window_sec=600.0, overlap_sec=30.0,
+              use_cache=True, cache_dir=None, force_stages=(), asr_mode="segments", language="ru"):
+    """
+    Обрабатывает набор записей. Модели загружаются один раз на процесс-воркер
+    и переиспользуются для всех его файлов.
+
+    :param jobs: список пар (input_path, reference_path)
+    :param workers: число процессов-воркеров (1 — в текущем процессе); с cpu_plan — верхняя граница
+    :param trace: сохранять трассировку каждого файла в <output_dir>/<имя>/trace.*
+    :param stages: выполняемые этапы (см. parse_stages); модели воркеров — только для них
+    :param cpu_plan: "auto", "throughput" или "latency" — число воркеров выбирается по числу ядер
+                     и файлов (см. models.resources.plan_resources); None — ровно workers воркеров
+    :param stream: обрабатывать каждую запись окнами (см. main)
+    :param use_cache: читать и сохранять результаты этапов в кэше cache_dir
+    :param force_stages: этапы, которые нужно пересчитать независимо от кэша
+    :param asr_mode: "segments" или "full" (см. main)
+    :param language: язык распознавания в режиме segments
+    :return: путь к сводной таблице summary.csv
+    """
+    options = dict(stream=stream, window_sec=window_sec, overlap_sec=overlap_sec,
+                   use_cache=use_cache, cache_dir=cache_dir, force_stages=tuple(force_stages),
+                   asr_mode=asr_mode, language=language)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    # потоки torch делятся между воркерами, иначе каждый занимает все ядра
+    if cpu_plan:
+        plan = plan_resources(len(jobs), mode=cpu_plan, max_workers=workers)
+    else:
+        plan = plan_resources(len(jobs), workers=workers or 1)
+    workers = plan.workers
+    print(f"📂 Пакетная обработка: {len(jobs)} файлов, воркеров: {workers}")
+    print(f"🧮 Ресурсы: {plan.describe()}")
+
+    results = [None] * len(jobs)
+    if workers <= 1:
+        _init_worker(stages, plan)
+        for i, (audio, ref) in enumerate(jobs):
+            results[i] = _run_job(audio, ref, str(output_dir), debug, save_audio, trace, stages, **options)
+            print(f"📌 [{i + 1}/{len(jobs)}] {audio}: {results[i]['status']}")
+    else:
+        counter = multiprocessing.Value("i", 0)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(stages, plan, counter)) as pool:
+            futures = {pool.submit(_run_job, audio, ref, str(output_dir), debug, save_audio, trace, stages,
+                                   **options): i
+                       for i, (audio, ref) in enumerate(jobs)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                results[i] = future.result()
+                print(f"📌 [{done}/{len(jobs)}] {jobs[i][0]}: {results[i]['status']}")
+
+    summary_path = output_dir / "summary.csv"
+    write_summary(results, summary_path)
+    failed = sum(r["status"] != "ok" for r in results)
+    print(f"\n📊 Сводка сохранена: {summary_path} (ошибок: {failed})")
+    return summary_path
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Speech Feedback Pipeline")
-    parser.add_argument("--input", required=True, help="Path to main audio file (wav)")
-    parser.add_argument("--reference", required=True, help="Path to reference speaker audio (wav)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Path to main audio file (wav)")
+    source.add_argument("--input-dir", help="Directory with wav files for batch mode")
+    source.add_argument("--manifest", help="CSV with columns input[,reference] for batch mode")
+    source.add_argument("--transcript", help="Existing transcript (txt) for --stages starting at analysis")
+    parser.add_argument("--reference", help="Path to reference speaker audio (wav)")
     parser.add_argument("--output", default="data/output", help="Output directory")
+    parser.add_argument("--workers", type=int,
+                        help="Number of worker processes in batch mode (default 1; upper bound with --cpu-plan)")
+    parser.add_argument("--cpu-plan", choices=("auto", "throughput", "latency"),
+                        help="Batch mode: choose workers and per-worker torch threads from the core count and "
+                             "number of files, and pin each worker to its own cores")
     parser.add_argument("--debug", action="store_true",
                         help="Включить режим отладки (добавляет постфиксы к результатам)")
+    parser.add_argument("--save-audio", action="store_true", help="Save the cleaned target speaker WAV")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process long recordings in overlapping windows with bounded memory")
+    parser.add_argument("--window", type=float, default=600.0, help="Streaming window length, seconds")
+    parser.add_argument("--window-overlap", type=float, default=30.0, help="Streaming window overlap, seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write stage checkpoints")
+    parser.add_argument("--cache-dir", help="Stage checkpoint directory (default: .cache/stages)")
+    parser.add_argument("--force-stage", action="append", default=[], choices=STAGES,
+                        help="Recompute this stage even if it is cached (can be repeated)")
+    parser.add_argument("--asr-mode", choices=("segments", "full"), default="segments",
+                        help="Transcribe target segments in batched 30 s windows with timestamps, "
+                             "or the whole combined audio at once")
+    parser.add_argument("--language", default="ru", help="ASR language for --asr-mode segments")
+    parser.add_argument("--trace", metavar="PREFIX",
+                        help="Write a trace of stages, model loads, inference and HTTP calls to "
+                             "PREFIX.jsonl and PREFIX.chrome.json (batch mode: per file, any value)")
+    parser.add_argument("--precision", choices=("fp32", "int8"),
+                        help="int8: dynamic quantisation of Whisper and Sepformer linear layers on CPU "
+                             "(default: SPEECH_ANREC_PRECISION or fp32)")
+    parser.add_argument("--stages", default=",".join(PIPELINE_STAGES),
+                        help="Comma-separated consecutive stages to run, starting at diarization (audio + "
+                             "reference), asr (clean WAV) or analysis (--transcript), e.g. asr,analysis,feedback")
 
     args = parser.parse_args()
+    if args.precision:
+        # через окружение настройка доходит и до процессов-воркеров пакетного режима
+        os.environ["SPEECH_ANREC_PRECISION"] = args.precision
+    try:
+        stages = parse_stages(args.stages)
+    except ValueError as e:
+        parser.error(str(e))
+    entry = ENTRY_STAGES[stages[0]]
+    if entry == "transcript" and not (args.transcript or args.input):
+        parser.error(f"--transcript is required with --stages {args.stages}")
+    if entry == "audio" and args.transcript:
+        parser.error("--transcript needs --stages starting at analysis")
+    if stages[0] == "diarization" and not args.reference and not args.manifest:
+        parser.error("--reference is required when running diarization")
+    if args.stream and args.window <= 0:
+        parser.error("--window must be positive")
+    if args.stream and not 0 <= args.window_overlap < args.window:
+        parser.error("--window-overlap must be at least 0 and shorter than --window")
 
-    main(
-        audio_path=args.input,
-        reference_path=args.reference,
-        output_dir=args.output,
-        debug=args.debug
-    )
+    if args.input or args.transcript:
+        main(
+            audio_path=args.input,
+            reference_path=args.reference,
+            transcript_input=args.transcript,
+            output_dir=args.output,
+            debug=args.debug,
+            save_audio=args.save_audio,
+            stream=args.stream,
+            window_sec=args.window,
+            overlap_sec=args.window_overlap,
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            force_stages=args.force_stage,
+            asr_mode=args.asr_mode,
+            language=args.language,
+            trace=args.trace,
+            stages=stages
+        )
+    else:
+        if entry != "audio":
+            parser.error("Batch mode processes audio; use models.analysis.analyze_corpus for transcripts")
+        run_batch(
+            jobs=collect_jobs(args.input_dir, args.manifest, args.reference,
+                              require_reference=stages[0] == "diarization"),
+            output_dir=args.output,
+            workers=args.workers,
+            debug=args.debug,
+            save_audio=args.save_audio,
+            trace=bool(args.trace),
+            stages=stages,
+            cpu_plan=args.cpu_plan,
+            stream=args.stream,
+            window_sec=args.window,
+            overlap_sec=args.window_overlap,
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            force_stages=args.force_stage,
+            asr_mode=args.asr_mode,
+            language=args.language
+        )
@@ -0,0 +1,251 @@
+# tests/benchmark.py
+"""
+Бенчмарк пайплайна на записях tests/data/audio/ali.
+
+    python tests/benchmark.py --mode stub --output bench_stub.json
+    python tests/benchmark.py --mode real --output bench_real.json
+    python tests/benchmark.py --mode real --precision int8 --output bench_int8.json
+    python tests/benchmark.py --compare bench_old.json bench_new.json
+
+В режиме stub модели заменяются детерминированными заглушками (tests/stub_backends.py),
+в режиме real используются настоящие модели из локального кэша.
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import warnings
+
+from models import registry
+from models.tracing import peak_rss_mb, span, start_tracing, stop_tracing
+
+ROOT = Path(__file__).resolve().parent.parent
+AUDIO_DIR = ROOT / "tests/data/audio/ali"
+REFERENCE = ROOT / "tests/data/audio/reference/ali_imba_drink.wav"
+SAMPLE_RATE = 16000
+STAGES = ("decode", "diarization", "speaker_id", "separation", "combine", "asr", "analysis")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_file(audio_path, ref_embed, asr_mode, whisper_size):
+    """
+    Прогоняет одну запись по этапам пайплайна (без LLM) под трассировкой.
+
+    :return: словарь с временем этапов, RTF, сегментами/с и пиковой памятью
+    """
+    from models.analysis import analyze_transcript
+    from models.asr import segments_to_text, transcribe_audio, transcribe_segments
+    from models.audio_buffer import AudioBuffer
+    from models.combine import combine_segments
+    from models.diarization import run_diarization
+    from models.separation import run_separation
+    from models.speaker_id import identify_target_speaker
+
+    tracer = start_tracing()
+    try:
+        with span("stage:pipeline") as total:
+            with span("stage:decode"):
+                audio = AudioBuffer.from_file(audio_path)
+            duration = audio.duration
+            total["audio_seconds"] = duration
+
+            with span("stage:diarization", audio_seconds=duration):
+                mono_segments, multi_segments, _ = run_diarization(audio)
+            with span("stage:speaker_id", audio_seconds=sum(e - s for s, e, _ in mono_segments)):
+                target, _, _, sr, encoder = identify_target_speaker(
+                    REFERENCE, audio, mono_segments, sample_rate=SAMPLE_RATE, ref_embed=ref_embed)
+            with span("stage:separation") as record:
+                target_segments = run_separation(audio, SAMPLE_RATE, multi_segments, target, ref_embed, encoder)
+                record["audio_seconds"] = sum(e - s for s, e, spk in multi_segments if target in spk)
+            with span("stage:combine"):
+                combined, placements = combine_segments(mono_segments, target_segments, target,
+                                                        audio.get(SAMPLE_RATE), SAMPLE_RATE, return_placements=True)
+            with span("stage:asr", audio_seconds=len(combined) / SAMPLE_RATE):
+                if asr_mode == "segments":
+                    transcript = segments_to_text(transcribe_segments(
+                        combined, placements, model_size=whisper_size, sample_rate=SAMPLE_RATE))
+                else:
+                    transcript = transcribe_audio(combined, model_size=whisper_size, sample_rate=SAMPLE_RATE)
+            with span("stage:analysis"):
+                analyze_transcript(transcript)
+    finally:
+        stop_tracing()
+
+    stages = {}
+    for event in tracer.events:
+        if event["name"].startswith("stage:"):
+            stages[event["name"][len("stage:"):]] = {
+                "wall_s": event["wall_s"],
+                "cpu_s": event["cpu_s"],
+                "audio_seconds": event["audio_seconds"],
+                "rtf": event.get("rtf"),
+            }
+    n_segments = len(mono_segments) + len(multi_segments)
+    n_separated = sum(target in spk for _, _, spk in multi_segments)
+    stages["separation"]["segments_per_s"] = n_separated / max(stages["separation"]["wall_s"], 1e-9)
+    stages["pipeline"]["segments_per_s"] = n_segments / max(stages["pipeline"]["wall_s"], 1e-9)
+
+    return {
+        "file": Path(audio_path).name,
+        "duration": duration,
+        "target_speaker": target,
+        "segments": {"mono": len(mono_segments), "multi": len(multi_segments), "separated": n_separated,
+                     "kept": len(target_segments)},
+        "transcript_words": len(transcript.split()),
+        "stages": stages,
+        "spans": {name: row for name, row in tracer.summary().items() if not name.startswith("stage:")},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def summarize(files):
+    """Суммарное время этапов по всем файлам и RTF относительно общей длительности."""
+    audio_total = sum(f["duration"] for f in files)
+    summary = {}
+    for stage in STAGES + ("pipeline",):
+        wall = sum(f["stages"][stage]["wall_s"] for f in files if stage in f["stages"])
+        cpu = sum(f["stages"][stage]["cpu_s"] for f in files if stage in f["stages"])
+        summary[stage] = {"wall_s": wall, "cpu_s": cpu, "rtf": wall / audio_total if audio_total else None}
+    segments = sum(f["segments"]["mono"] + f["segments"]["multi"] for f in files)
+    separated = sum(f["segments"]["separated"] for f in files)
+    summary["pipeline"]["segments_per_s"] = segments / max(summary["pipeline"]["wall_s"], 1e-9)
+    summary["separation"]["segments_per_s"] = separated / max(summary["separation"]["wall_s"], 1e-9)
+    summary["audio_seconds"] = audio_total
+    summary["peak_rss_mb"] = max((f["peak_rss_mb"] for f in files), default=0.0)
+    return summary
+
+
+def run(mode="stub", files=None, repeat=1, asr_mode=None, whisper_size="small", output=None, precision="fp32"):
+    """
+    :param mode: "stub" — заглушки вместо моделей, "real" — настоящие модели из локального кэша
+    :param files: список WAV (по умолчанию все *.wav из tests/data/audio/ali)
+    :param repeat: сколько раз прогнать весь набор (в результат идёт последний прогон)
+    :param asr_mode: "segments" или "full"; у заглушки Whisper есть только "full"
+    :param precision: "fp32" или "int8" (только для real — заглушки не квантуются)
+    :return: словарь с результатами
+    """
+    warnings.filterwarnings("ignore")
+    files = [Path(f) for f in files] if files else sorted(AUDIO_DIR.glob("*.wav"))
+    previous = None
+    if mode == "stub":
+        from tests import stub_backends
+        previous = stub_backends.install()
+        asr_mode = "full"
+        precision = "fp32"
+    else:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")  # только локально закэшированные веса
+        asr_mode = asr_mode or "segments"
+    os.environ["SPEECH_ANREC_PRECISION"] = precision
+
+    try:
+        from resemblyzer import preprocess_wav
+        from resemblyzer.hparams import sampling_rate
+        from models.resample import load_audio
+        from models.speaker_id import embed_utterances
+
+        # модели грузятся до замеров; эталон кодируется напрямую, мимо общего кэша эмбеддингов
+        registry.warmup(whisper_size=whisper_size)
+        encoder = registry.get_voice_encoder()
+        ref_embed = embed_utterances([preprocess_wav(load_audio(REFERENCE, sampling_rate),
+                                                     source_sr=sampling_rate)], encoder)[0]
+
+        for i in range(repeat):
+            results = []
+            for audio_path in files:
+                print(f"⏱️ [{i + 1}/{repeat}] {audio_path.name}")
+                results.append(benchmark_file(audio_path, ref_embed, asr_mode, whisper_size))
+        models = [{"kind": kind, "name": name or size, "device": device, "precision": precision, **stats}
+                  for (kind, name, size, device, precision), stats in registry.model_stats().items()]
+    finally:
+        if previous is not None:
+            stub_backends.restore(previous)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "mode": mode,
+        "asr_mode": asr_mode,
+        "precision": precision,
+        "whisper_size": whisper_size,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "models": models,
+        "summary": summarize(results),
+        "files": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены: {output}")
+    return report
+
+
+def print_summary(report):
+    summary = report["summary"]
+    print(f"\n📊 {report['mode']}, {len(report['files'])} файлов, {summary['audio_seconds']:.1f} сек аудио")
+    for stage in STAGES + ("pipeline",):
+        row = summary[stage]
+        print(f"• {stage}: {row['wall_s']:.3f} сек, CPU {row['cpu_s']:.3f} сек, RTF {row['rtf']:.4f}")
+    print(f"• сегментов/с: {summary['pipeline']['segments_per_s']:.1f} (separation: "
+          f"{summary['separation']['segments_per_s']:.1f})")
+    print(f"• пиковый RSS: {summary['peak_rss_mb']:.0f} МБ")
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """
+    Сравнивает время этапов двух прогонов.
+
+    :param threshold: относительное замедление, начиная с которого этап считается регрессией
+    :return: список этапов с регрессией
+    """
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"🔍 {old.get('revision')} ({old['mode']}, {old.get('precision', 'fp32')}) → "
+          f"{new.get('revision')} ({new['mode']}, {new.get('precision', 'fp32')})")
+
+    regressions = []
+    for stage in STAGES + ("pipeline",):
+        before, after = old["summary"][stage]["wall_s"], new["summary"][stage]["wall_s"]
+        change = (after - before) / before if before else 0.0
+        mark = "⚠️" if change > threshold else "✅"
+        print(f"{mark} {stage}: {before:.3f} → {after:.3f} сек ({change:+.1%})")
+        if change > threshold:
+            regressions.append(stage)
+    before, after = old["summary"]["peak_rss_mb"], new["summary"]["peak_rss_mb"]
+    print(f"• пиковый RSS: {before:.0f} → {after:.0f} МБ")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speech pipeline benchmark")
+    parser.add_argument("--mode", choices=("stub", "real"), default="stub")
+    parser.add_argument("--files", nargs="*", help="WAV files (default: tests/data/audio/ali/*.wav)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the whole set N times, keep the last run")
+    parser.add_argument("--asr-mode", choices=("segments", "full"), help="ASR mode for --mode real")
+    parser.add_argument("--whisper-size", default="small")
+    parser.add_argument("--precision", choices=("fp32", "int8"), default="fp32", help="Model precision for --mode real")
+    parser.add_argument("--output", help="Where to save JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two JSON results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown treated as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+    print_summary(run(args.mode, args.files, args.repeat, args.asr_mode, args.whisper_size, args.output,
+                      args.precision))
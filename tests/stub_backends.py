@@ -0,0 +1,119 @@
+# tests/stub_backends.py
+"""
+Детерминированные лёгкие заменители pyannote, Sepformer, Resemblyzer и Whisper.
+
+Интерфейсы совпадают с теми частями моделей, которыми пользуется пайплайн,
+а работа — почти нулевая, поэтому бенчмарк на заглушках измеряет накладные
+расходы самого пайплайна (нарезка, пачки, склейка, анализ) без GPU и сети.
+"""
+from collections import namedtuple
+
+import soundfile as sf
+import torch
+from resemblyzer import VoiceEncoder, hparams
+
+from models import registry
+
+Turn = namedtuple("Turn", "start end")
+
+WORDS = ("ну", "вот", "как", "бы", "мы", "сегодня", "обсуждаем", "проект", "и", "в", "общем",
+         "это", "самое", "типа", "работает", "быстро", "значит", "надо", "проверить", "результат")
+
+
+class StubDiarization:
+    """
+    Два спикера по очереди: A говорит 5 сек, B — 4.5 сек с перекрытием
+    по 1 сек на каждой смене, цикл 8 сек.
+    """
+
+    def __init__(self, cycle=8.0):
+        self.cycle = cycle
+
+    def __call__(self, audio):
+        if isinstance(audio, dict):
+            duration = audio["waveform"].shape[-1] / audio["sample_rate"]
+        else:
+            duration = sf.info(str(audio)).duration
+        turns = []
+        t = 0.0
+        while t < duration:
+            turns.append((Turn(t, min(t + 5.0, duration)), "SPEAKER_00"))
+            if t + 4.0 < duration:
+                turns.append((Turn(t + 4.0, min(t + self.cycle + 1.0, duration)), "SPEAKER_01"))
+            t += self.cycle
+        return StubAnnotation(turns)
+
+
+class StubAnnotation:
+    def __init__(self, turns):
+        self.turns = turns
+
+    def itertracks(self, yield_label=False):
+        for i, (turn, label) in enumerate(self.turns):
+            yield (turn, i, label) if yield_label else (turn, i)
+
+
+class StubSepformer:
+    """Первый поток — сама смесь, второй — она же, ослабленная и сдвинутая."""
+
+    def separate_batch(self, mix):
+        return torch.stack([mix, 0.1 * torch.roll(mix, 80, dims=-1)], dim=-1)
+
+
+class StubVoiceEncoder(torch.nn.Module):
+    """
+    Эмбеддинг — средний мел-спектр окна, спроецированный фиксированной
+    случайной матрицей. Нарезка на окна — та же, что у Resemblyzer.
+    """
+
+    compute_partial_slices = staticmethod(VoiceEncoder.compute_partial_slices)
+
+    def __init__(self, device="cpu"):
+        super().__init__()
+        generator = torch.Generator().manual_seed(0)
+        self.register_buffer("projection", torch.randn(hparams.mel_n_channels, 256, generator=generator))
+        self.device = torch.device(device)
+
+    def forward(self, mels):
+        embeds = torch.log1p(mels).mean(dim=1) @ self.projection
+        return embeds / embeds.norm(dim=1, keepdim=True).clamp_min(1e-12)
+
+    def embed_utterance(self, wav):
+        from models.speaker_id import embed_utterances
+        return embed_utterances([wav], self)[0]
+
+
+class StubWhisper:
+    """Текст из фиксированного словаря, ~2.5 слова в секунду аудио."""
+
+    device = torch.device("cpu")
+
+    def transcribe(self, audio, **kwargs):
+        if isinstance(audio, str):
+            audio, _ = sf.read(audio, dtype="float32")
+        n_words = max(1, int(len(audio) / 16000 * 2.5))
+        words = [WORDS[(i * 7 + len(audio)) % len(WORDS)] for i in range(n_words)]
+        sentences = [" ".join(words[i:i + 12]) for i in range(0, n_words, 12)]
+        return {"text": ". ".join(sentences) + "."}
+
+
+STUB_LOADERS = {
+    "pyannote": lambda name, size, device: StubDiarization(),
+    "sepformer": lambda name, size, device: StubSepformer(),
+    "resemblyzer": lambda name, size, device: StubVoiceEncoder(device),
+    "whisper": lambda name, size, device: StubWhisper(),
+}
+
+
+def install():
+    """
+    Подменяет загрузчики реестра моделей заглушками.
+
+    :return: прежние загрузчики (для restore)
+    """
+    return {kind: registry.register_loader(kind, loader) for kind, loader in STUB_LOADERS.items()}
+
+
+def restore(previous):
+    for kind, loader in previous.items():
+        registry.register_loader(kind, loader)
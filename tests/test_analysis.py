@@ -3,42 +3,37 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from pathlib import Path
 
-from models.analysis import analyze_transcript, save_report
+from models.analysis import analyze_corpus, analyze_transcript, save_report
 import pandas as pd
 
 INPUT_DIR = Path("tests/data/transcripts/")
 OUTPUT_DIR = Path("tests/data/output/text_analysis/")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-summary_rows = []
-
-for txt_file in INPUT_DIR.glob("*.txt"):
-    text = txt_file.read_text(encoding="utf-8")
-    report = analyze_transcript(text)
-
-    # Сохраняем индивидуальный отчёт
-    save_path = OUTPUT_DIR / f"{txt_file.stem}_report.txt"
-    save_report(report, save_path)
-    print(f"✅ Отчёт создан: {save_path}")
-
-    # Сохраняем строку для таблицы
-    metrics = report["metrics"]
-    summary_rows.append({
-        "Файл": txt_file.name,
-        "Слов": metrics["Общее количество слов"],
-        "Уникальных": metrics["Уникальных слов"],
-        "TTR": metrics["Type-Token Ratio (TTR)"],
-        "Длина предложения": metrics["Средняя длина предложения"],
-        "Предложений": metrics["Количество предложений"],
-        "Слов-паразитов": metrics["Количество слов-паразитов"],
-        "Уникальных паразитов": metrics["Уникальных слов-паразитов"]
-    })
-
-# Создаём итоговую таблицу
-summary_df = pd.DataFrame(summary_rows)
-summary_path = OUTPUT_DIR / "summary_table.csv"
-summary_df.to_csv(summary_path, index=False, encoding="utf-8")
-print(f"\n📊 Таблица метрик сохранена: {summary_path}\n")
-
-# Печать таблицы в консоль
-print(summary_df.to_markdown(index=False))
+# воркеры analyze_corpus при spawn заново импортируют этот модуль
+if __name__ == "__main__":
+    # Многословные паразиты считаются одной фразой, самое длинное совпадение побеждает
+    sample = analyze_transcript("Ну вот, на самом деле всё просто. В общем-то, как бы да.")
+    assert sample["filler_counts"] == {"ну вот": 1, "на самом деле": 1, "просто": 1, "в общем-то": 1, "как бы": 1}, sample
+    assert sample["metrics"]["Количество предложений"] == 2
+
+    for txt_file in INPUT_DIR.glob("*.txt"):
+        text = txt_file.read_text(encoding="utf-8")
+        report = analyze_transcript(text)
+
+        # Сохраняем индивидуальный отчёт
+        save_path = OUTPUT_DIR / f"{txt_file.stem}_report.txt"
+        save_report(report, save_path)
+        print(f"✅ Отчёт создан: {save_path}")
+
+    # Итоговая таблица считается по всему корпусу в воркерах и пишется построчно
+    summary_path = OUTPUT_DIR / "summary_table.csv"
+    corpus = analyze_corpus(sorted(INPUT_DIR.glob("*.txt")), output_path=summary_path, workers=2)
+    print(f"\n📊 Таблица метрик сохранена: {summary_path}\n")
+
+    # Печать таблицы и метрик корпуса в консоль
+    summary_df = pd.read_csv(summary_path)
+    print(summary_df.to_markdown(index=False))
+    print(f"\n📚 Текстов: {corpus['Текстов']}, слов: {corpus['Общее количество слов']}, "
+          f"словарь: {corpus['Размер словаря']}")
+    print(f"📈 Распределение TTR: {corpus['Распределение TTR']}")
@@ -17,54 +17,68 @@ DATASET_PATH = Path("tests/data/cv-corpus-21.0-delta-2025-03-14/ru")  # ← за
 N_SAMPLES = 10
 MODELS = ["tiny", "base", "small", "medium", "large"]  # можно сократить
 TEMP_DIR = Path("tests/data/temp/asr")
-TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
 WER_LOG_PATH = Path("tests/data/output/test_asr/asr_wer_results.txt")
-WER_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-WER_LOG_PATH.write_text("📊 WER по моделям:\n", encoding="utf-8")
 
 
-# === Шаг 1: загружаем данные ===
-df = pd.read_csv(DATASET_PATH / "validated.tsv", sep="\t")
-subset = df[df["sentence"].notnull()].sample(n=N_SAMPLES, random_state=42)
+def load_samples(dataset_path=DATASET_PATH, n_samples=N_SAMPLES, temp_dir=TEMP_DIR):
+    """
+    Случайная (но воспроизводимая) выборка Common Voice: пары (.wav 16 кГц, референс).
+    """
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    df = pd.read_csv(dataset_path / "validated.tsv", sep="\t")
+    subset = df[df["sentence"].notnull()].sample(n=n_samples, random_state=42)
 
-# === Шаг 2: создаём пары .wav + референс ===
-samples = []
-for i, row in enumerate(subset.itertuples()):
-    mp3_path = DATASET_PATH / "clips" / row.path
-    wav_path = TEMP_DIR / f"sample{i}.wav"
-    txt = row.sentence.strip().lower()
+    samples = []
+    for i, row in enumerate(subset.itertuples()):
+        mp3_path = dataset_path / "clips" / row.path
+        wav_path = temp_dir / f"sample{i}.wav"
+        txt = row.sentence.strip().lower()
 
-    # конвертация mp3 → wav
-    audio = AudioSegment.from_mp3(mp3_path)
-    audio.set_frame_rate(16000).export(wav_path, format="wav")
+        # конвертация mp3 → wav
+        audio = AudioSegment.from_mp3(mp3_path)
+        audio.set_frame_rate(16000).export(wav_path, format="wav")
 
-    samples.append((wav_path, txt))
+        samples.append((wav_path, txt))
+    return samples
 
-# === Шаг 3: тестируем модели ===
-results = []
 
-for model_size in MODELS:
-    print(f"\n🧪 Тестируем модель Whisper {model_size}")
-    model = whisper.load_model(model_size)
+def evaluate_wer(model, samples, language="ru"):
+    """
+    :param model: загруженная модель Whisper
+    :return: средний WER по samples
+    """
     wers = []
-
     for wav_path, reference in tqdm(samples):
-        result = model.transcribe(str(wav_path), language="ru")
+        result = model.transcribe(str(wav_path), language=language)
         hypothesis = result["text"].strip().lower()
-        sample_wer = wer(reference, hypothesis)
-        wers.append(sample_wer)
-
-    avg_wer = sum(wers) / len(wers)
-    results.append((model_size, avg_wer))
-
-    # Сохраняем результат в файл
-    with open(WER_LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(f"- {model_size}: {avg_wer:.3f}\n")
-
-# === Шаг 4: вывод результатов ===
-print("\n📊 Сводка WER по моделям:")
-print("| Model   | WER  |")
-print("|---------|------|")
-for model, score in results:
-    print(f"| {model:<7} | {score:.3f} |")
+        wers.append(wer(reference, hypothesis))
+    return sum(wers) / len(wers)
+
+
+if __name__ == "__main__":
+    WER_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    WER_LOG_PATH.write_text("📊 WER по моделям:\n", encoding="utf-8")
+
+    # === Шаг 1–2: загружаем данные и создаём пары .wav + референс ===
+    samples = load_samples()
+
+    # === Шаг 3: тестируем модели ===
+    results = []
+
+    for model_size in MODELS:
+        print(f"\n🧪 Тестируем модель Whisper {model_size}")
+        model = whisper.load_model(model_size)
+        avg_wer = evaluate_wer(model, samples)
+        results.append((model_size, avg_wer))
+
+        # Сохраняем результат в файл
+        with open(WER_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(f"- {model_size}: {avg_wer:.3f}\n")
+
+    # === Шаг 4: вывод результатов ===
+    print("\n📊 Сводка WER по моделям:")
+    print("| Model   | WER  |")
+    print("|---------|------|")
+    for model, score in results:
+        print(f"| {model:<7} | {score:.3f} |")
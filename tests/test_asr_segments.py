@@ -0,0 +1,127 @@
+# tests/test_asr_segments.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from models.asr import WHISPER_SR, _assign_pieces, _decode_with_fallback, _pack_windows, _timed_pieces
+
+WINDOW = 10 * WHISPER_SR  # окно поменьше, чтобы тесты оставались лёгкими
+
+
+class FakeTokenizer:
+    """Токены < 100 — слова, 100 — конец текста, от 1000 — временные метки с шагом 0.02 сек."""
+    eot = 100
+    timestamp_begin = 1000
+
+    def decode(self, tokens):
+        return " ".join(f"w{t}" for t in tokens)
+
+
+def ts(seconds):
+    return FakeTokenizer.timestamp_begin + int(round(seconds / 0.02))
+
+
+def placements(lengths_sec):
+    result, offset, start = [], 0, 0.0
+    for length in lengths_sec:
+        samples = int(length * WHISPER_SR)
+        result.append((offset, samples, start, start + length))
+        offset += samples
+        start += length + 1.0  # между фрагментами в исходной записи — пауза
+    return result
+
+
+def test_pack_windows():
+    layout = placements([3, 4, 5, 25])
+    audio = np.arange(layout[-1][0] + layout[-1][1], dtype=np.float32)
+    windows = _pack_windows(audio, layout, WINDOW)
+
+    # фрагменты не разрываются, пока помещаются; длинный режется по длине окна
+    assert [[(idx, len(piece), offset) for idx, piece, offset in w] for w in windows] == [
+        [(0, 3 * WHISPER_SR, 0), (1, 4 * WHISPER_SR, 3 * WHISPER_SR)],
+        [(2, 5 * WHISPER_SR, 0)],
+        [(3, WINDOW, 0)],
+        [(3, WINDOW, 0)],
+        [(3, 5 * WHISPER_SR, 0)],
+    ]
+    assert all(sum(len(piece) for _, piece, _ in w) <= WINDOW for w in windows)
+    # окна подряд восстанавливают склейку без пропусков и повторов
+    assert np.array_equal(np.concatenate([piece for w in windows for _, piece, _ in w]), audio)
+
+
+def test_timed_pieces():
+    tokenizer = FakeTokenizer()
+    tokens = [ts(0.0), 1, 2, ts(1.5), ts(1.5), 3, ts(4.0), ts(4.0), 4, 5, tokenizer.eot]
+    assert _timed_pieces(tokens, tokenizer, 30.0) == [
+        (0.0, 1.5, "w1 w2"),
+        (1.5, 4.0, "w3"),
+        (4.0, 30.0, "w4 w5"),  # без закрывающей метки кусочек тянется до конца окна
+    ]
+    assert _timed_pieces([ts(0.0), tokenizer.eot], tokenizer, 30.0) == []
+
+
+def test_assign_pieces_by_midpoint():
+    audio = np.zeros(12 * WHISPER_SR, dtype=np.float32)
+    [window] = _pack_windows(audio, placements([3, 4]), WINDOW)  # фрагменты 0–3 и 3–7 сек окна
+    pieces = [
+        (0.0, 2.0, "a"),   # целиком в первом
+        (2.0, 5.0, "b"),   # пересекает границу, середина 3.5 — во втором
+        (1.0, 4.8, "c"),   # середина 2.9 — ещё в первом
+        (8.0, 10.0, "d"),  # после последнего фрагмента (тишина паддинга) — ближайший
+    ]
+    assert _assign_pieces(window, pieces) == [(0, "a"), (1, "b"), (0, "c"), (1, "d")]
+
+
+def test_fragment_across_windows():
+    layout = placements([2, 15])
+    audio = np.zeros(layout[-1][0] + layout[-1][1], dtype=np.float32)
+    windows = _pack_windows(audio, layout, WINDOW)
+    assert [[idx for idx, _, _ in w] for w in windows] == [[0], [1], [1]]
+    # текст обеих частей длинного фрагмента достаётся ему же
+    assigned = [_assign_pieces(w, [(0.0, 1.0, f"part{i}")]) for i, w in enumerate(windows[1:])]
+    assert assigned == [[(1, "part0")], [(1, "part1")]]
+
+
+def result(compression_ratio=1.5, avg_logprob=-0.3, no_speech_prob=0.1, text=""):
+    return SimpleNamespace(compression_ratio=compression_ratio, avg_logprob=avg_logprob,
+                           no_speech_prob=no_speech_prob, text=text)
+
+
+def test_decode_with_fallback():
+    mels = torch.arange(4).view(4, 1, 1).float()
+    calls = []
+    loop = result(compression_ratio=3.1, text="да да да да")
+
+    def decode(batch, temperature):
+        windows = [int(m) for m in batch.flatten()]
+        calls.append((windows, temperature))
+        out = []
+        for w in windows:
+            if w == 1 and temperature < 0.4:
+                out.append(loop)                                     # зацикливание
+            elif w == 2:
+                out.append(result(avg_logprob=-1.5, text=f"t{temperature}"))  # не проходит никогда
+            elif w == 3:
+                out.append(result(avg_logprob=-1.5, no_speech_prob=0.9))      # тишина — без повторов
+            else:
+                out.append(result(text=f"ok{w}@{temperature}"))
+        return out
+
+    results = _decode_with_fallback(decode, mels)
+    assert calls[0] == ([0, 1, 2, 3], 0.0)
+    assert calls[1:3] == [([1, 2], 0.2), ([1, 2], 0.4)]
+    assert all(windows == [2] for windows, _ in calls[3:]) and calls[-1][1] == 1.0
+    assert [r.text for r in results[:3]] == ["ok0@0.0", "ok1@0.4", "t1.0"]
+    assert results[3].no_speech_prob == 0.9
+
+
+if __name__ == "__main__":
+    for test in (test_pack_windows, test_timed_pieces, test_assign_pieces_by_midpoint,
+                 test_fragment_across_windows, test_decode_with_fallback):
+        test()
+        print(f"✅ {test.__name__}")
@@ -5,7 +5,7 @@ import pandas as pd
 
 from pathlib import Path
 from models.analysis import analyze_transcript
-from models.feedback import generate_feedback
+from models.feedback import FeedbackClient
 
 from dotenv import load_dotenv
 import os
@@ -19,38 +19,45 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 summary_rows = []
 
-for txt_file in INPUT_DIR.glob("*.txt"):
+# Анализируем все тексты, затем отправляем их в LLM параллельно
+files = sorted(INPUT_DIR.glob("*.txt"))
+analyses = []
+items = []
+for txt_file in files:
     text = txt_file.read_text(encoding="utf-8")
     analysis = analyze_transcript(text)
     metrics = analysis["metrics"]
-
-    print(f"📨 Отправляем текст: {txt_file.name}")
-    try:
-        feedback = generate_feedback(
-            transcribed_text=text,
-            total_words=metrics["Общее количество слов"],
-            unique_words=metrics["Уникальных слов"],
-            ttr=metrics["Type-Token Ratio (TTR)"],
-            avg_sentence_length=metrics["Средняя длина предложения"],
-            filler_counts=analysis["filler_counts"],
-            api_key=API_KEY
-        )
-
-        feedback_path = OUTPUT_DIR / f"{txt_file.stem}_feedback.txt"
-        feedback_path.write_text(feedback, encoding="utf-8")
-        print(f"✅ Рекомендации сохранены: {feedback_path}")
-
-        summary_rows.append({
-            "Файл": txt_file.name,
-            "Паразитов": metrics["Количество слов-паразитов"],
-            "TTR": metrics["Type-Token Ratio (TTR)"],
-            "Рекомендации": feedback[:120].replace("\n", " ") + "..."
-        })
-
-        summary_df = pd.DataFrame(summary_rows)
-        summary_df.to_csv(OUTPUT_DIR / "feedback_summary.csv", index=False, encoding="utf-8")
-        print("\n📊 Сводка рекомендаций сохранена.")
-
-
-    except Exception as e:
-        print(f"❌ Ошибка для {txt_file.name}: {e}")
+    analyses.append(analysis)
+    items.append(dict(
+        transcribed_text=text,
+        total_words=metrics["Общее количество слов"],
+        unique_words=metrics["Уникальных слов"],
+        ttr=metrics["Type-Token Ratio (TTR)"],
+        avg_sentence_length=metrics["Средняя длина предложения"],
+        filler_counts=analysis["filler_counts"]
+    ))
+
+print(f"📨 Отправляем тексты: {len(items)}")
+client = FeedbackClient(API_KEY, max_concurrency=4)
+feedbacks = client.generate_batch(items)
+
+for txt_file, analysis, feedback in zip(files, analyses, feedbacks):
+    metrics = analysis["metrics"]
+    if isinstance(feedback, Exception):
+        print(f"❌ Ошибка для {txt_file.name}: {feedback}")
+        continue
+
+    feedback_path = OUTPUT_DIR / f"{txt_file.stem}_feedback.txt"
+    feedback_path.write_text(feedback, encoding="utf-8")
+    print(f"✅ Рекомендации сохранены: {feedback_path}")
+
+    summary_rows.append({
+        "Файл": txt_file.name,
+        "Паразитов": metrics["Количество слов-паразитов"],
+        "TTR": metrics["Type-Token Ratio (TTR)"],
+        "Рекомендации": feedback[:120].replace("\n", " ") + "..."
+    })
+
+summary_df = pd.DataFrame(summary_rows)
+summary_df.to_csv(OUTPUT_DIR / "feedback_summary.csv", index=False, encoding="utf-8")
+print("\n📊 Сводка рекомендаций сохранена.")
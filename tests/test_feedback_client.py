@@ -0,0 +1,160 @@
+# tests/test_feedback_client.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from models.feedback import FeedbackClient, ResponseCache, get_client
+
+METRICS = dict(total_words=3, unique_words=3, ttr=1.0, avg_sentence_length=3.0, filler_counts={"ну": 1})
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка OpenRouter: сценарий ответов задаётся через server.plan."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            status = server.plan.pop(0) if server.plan else 200
+        time.sleep(server.delay)
+
+        if status == 200:
+            prompt = body["messages"][0]["content"]
+            payload = {"choices": [{"message": {"content": f"ответ на {len(prompt)} символов"}}]}
+            headers = {}
+        else:
+            payload = {"error": "busy"}
+            headers = {"Retry-After": "0"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in(plan=(), delay=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.plan, server.delay = list(plan), delay
+    server.lock = threading.Lock()
+    server.requests = server.active = server.max_active = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1/chat/completions"
+
+
+def test_retries_on_429_and_5xx():
+    server, url = start_stand_in(plan=[429, 503])
+    client = FeedbackClient("test-key", api_url=url, backoff_factor=0)
+    try:
+        answer = client.generate(transcribed_text="ну это тест", **METRICS)
+        assert answer.startswith("ответ"), answer
+        assert server.requests == 3, server.requests
+    finally:
+        server.shutdown()
+
+
+def test_gives_up_after_retries():
+    server, url = start_stand_in(plan=[500] * 10)
+    client = FeedbackClient("test-key", api_url=url, retries=2, backoff_factor=0)
+    try:
+        client.generate(transcribed_text="тест", **METRICS)
+        raise AssertionError("ожидалась ошибка API")
+    except RuntimeError as e:
+        assert "500" in str(e)
+        assert server.requests == 3, server.requests
+    finally:
+        server.shutdown()
+
+
+def test_batch_respects_concurrency_limit():
+    server, url = start_stand_in(delay=0.1)
+    client = FeedbackClient("test-key", api_url=url, max_concurrency=3)
+    try:
+        items = [dict(transcribed_text=f"текст {i}", **METRICS) for i in range(9)]
+        answers = client.generate_batch(items)
+        assert len(answers) == 9 and all(isinstance(a, str) for a in answers)
+        assert server.max_active <= 3, server.max_active
+        assert server.max_active > 1, server.max_active
+    finally:
+        server.shutdown()
+
+
+def test_cached_responses_skip_api():
+    server, url = start_stand_in()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "feedback.sqlite"
+        client = FeedbackClient("test-key", api_url=url, cache=ResponseCache(path))
+        try:
+            first = client.generate(transcribed_text="ну это тест", **METRICS)
+            with mock.patch.object(client.session, "post", wraps=client.session.post) as post:
+                second = client.generate(transcribed_text="ну это тест", **METRICS)
+            assert first == second and server.requests == 1, server.requests
+            assert post.call_count == 0, post.call_args_list
+
+            # новый процесс видит ответ на диске; другая модель — другой ключ
+            cache = ResponseCache(path)
+            again = FeedbackClient("test-key", api_url=url, cache=cache)
+            assert again.generate(transcribed_text="ну это тест", **METRICS) == first
+            other = FeedbackClient("test-key", api_url=url, model="other/model", cache=cache)
+            other.generate(transcribed_text="ну это тест", **METRICS)
+            assert server.requests == 2, server.requests
+            assert cache.stats() == {"memory_hits": 0, "disk_hits": 1, "misses": 1}, cache.stats()
+        finally:
+            server.shutdown()
+
+
+def test_cache_ttl_and_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(Path(tmp) / "feedback.sqlite", memory_size=2, max_entries=2, ttl=0.2)
+        for i in range(3):
+            cache.put(f"k{i}", f"v{i}")
+        assert cache.get("k0") is None  # вытеснен и из памяти, и с диска
+        assert cache.get("k2") == "v2"
+        time.sleep(0.3)
+        assert cache.get("k2") is None  # истёк срок жизни
+
+
+def test_disk_hit_keeps_disk_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "feedback.sqlite"
+        ResponseCache(path, ttl=0.5).put("k", "v")
+        time.sleep(0.3)
+        cache = ResponseCache(path, ttl=0.5)
+        assert cache.get("k") == "v"  # с диска, копия попадает в память
+        time.sleep(0.3)
+        # на диске запись уже истекла — копия в памяти тоже
+        assert cache.get("k") is None, cache.stats()
+
+
+def test_shared_clients():
+    # и с кэшем, и без него клиент один на процесс: пул соединений не пересоздаётся на каждый вызов
+    uncached = get_client("test-key", use_cache=False)
+    assert uncached is get_client("test-key", use_cache=False) and uncached.cache is None
+    cached = get_client("test-key")
+    assert cached is get_client("test-key") and cached is not uncached and cached.cache is not None
+
+
+if __name__ == "__main__":
+    for test in (test_retries_on_429_and_5xx, test_gives_up_after_retries, test_batch_respects_concurrency_limit,
+                 test_cached_responses_skip_api, test_cache_ttl_and_eviction, test_disk_hit_keeps_disk_expiry,
+                 test_shared_clients):
+        test()
+        print(f"✅ {test.__name__}")
@@ -34,13 +34,14 @@ mono_segments, multi_segments, diarization_result = run_diarization(INPUT_AUDIO)
 save_segment_list(mono_segments, multi_segments, "auto", OUTDIR / "segments.txt")
 
 print("🎯 Определение целевого...")
-combined_audio_path, target_speaker = extract_target_speaker(
+_, combined_audio_path, target_speaker = extract_target_speaker(
     reference_path=REFERENCE,
     audio_path=INPUT_AUDIO,
     mono_segments=mono_segments,
     multi_segments=multi_segments,
     output_dir=OUTDIR,
-    debug=True
+    debug=True,
+    save_audio=True
 )
 
 print("🎼 Построение спектрограмм...")
@@ -0,0 +1,175 @@
+# tests/test_pipeline_server.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import http.client
+import json
+import socket
+import tempfile
+import threading
+
+from models import embedding_store
+from pipeline_server import PipelineService, make_server
+from models.registry import get_voice_encoder
+from tests import stub_backends
+
+INPUT_AUDIO = "tests/data/audio/overlapped_ali_vasya.wav"
+REFERENCE = "tests/data/audio/reference/ali_imba_drink.wav"
+STAGES = "diarization,separation,combine,asr,analysis"
+
+_state = {}
+
+
+def setup_module(module=None):
+    """Заглушки моделей и временный кэш эмбеддингов (тест не пишет в общий .cache)."""
+    _state["loaders"] = stub_backends.install()
+    _state["store_dir"] = tempfile.TemporaryDirectory()
+    embedding_store._default_store = embedding_store.EmbeddingStore(
+        Path(_state["store_dir"].name) / "embeddings.sqlite")
+
+
+def teardown_module(module=None):
+    stub_backends.restore(_state.pop("loaders"))
+    embedding_store._default_store = None
+    _state.pop("store_dir").cleanup()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def request(connect, method, path, payload=None):
+    conn = connect()
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    if response.getheader("Content-Type", "").startswith("application/x-ndjson"):
+        return response.status, [json.loads(line) for line in data.decode("utf-8").splitlines()]
+    return response.status, json.loads(data)
+
+
+def start(tmp, socket_path=None, **kwargs):
+    service = PipelineService(Path(tmp) / "out", stages=STAGES, **kwargs)
+    service.start()
+    server = make_server(service, port=0, socket_path=socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if socket_path:
+        return server, service, lambda: UnixHTTPConnection(socket_path)
+    return server, service, lambda: http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=60)
+
+
+def stop(server, service):
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+def test_job_lifecycle():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, service, connect = start(tmp)
+        try:
+            status, health = request(connect, "GET", "/health")
+            assert status == 200 and set(health["models"]) == {"pyannote", "resemblyzer", "sepformer", "whisper"}
+
+            status, reference = request(connect, "POST", "/references", {"path": REFERENCE})
+            assert status == 200, reference
+
+            jobs = [
+                {"input": INPUT_AUDIO, "reference": REFERENCE, "asr_mode": "full", "use_cache": False},
+                {"input": INPUT_AUDIO, "reference_id": reference["reference_id"], "asr_mode": "full",
+                 "use_cache": False},
+            ]
+            results = []
+            for payload in jobs:
+                status, job = request(connect, "POST", "/jobs", payload)
+                assert status == 202, job
+                status, events = request(connect, "GET", job["events"])
+                assert status == 200
+                assert events[0]["event"] == "queued" and events[-1]["event"] == "finished"
+                assert {e["task"] for e in events if e["event"] == "task_done"} >= {"diarization", "asr", "analysis"}
+                status, job = request(connect, "GET", f"/jobs/{job['id']}")
+                assert job["status"] == "done", job
+                assert Path(job["result"]["transcript"]).is_file() and Path(job["result"]["report"]).is_file()
+                results.append(job["result"])
+
+            # эмбеддинг по id совпадает с посчитанным по файлу — и целевой спикер тот же
+            assert results[0]["target_speaker"] == results[1]["target_speaker"]
+            print("✅ Задания по пути к эталону и по reference_id выполнены")
+        finally:
+            stop(server, service)
+
+
+def test_errors_and_queue_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        service = PipelineService(Path(tmp) / "out", stages=STAGES, queue_size=1)
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connect = lambda: http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=60)
+        try:
+            assert request(connect, "POST", "/jobs", {"input": INPUT_AUDIO})[0] == 400
+            assert request(connect, "POST", "/jobs", {"input": "missing.wav", "reference": REFERENCE})[0] == 400
+            assert request(connect, "GET", "/jobs/unknown")[0] == 404
+
+            # исполнители не запущены: первое задание ждёт в очереди, второе не помещается
+            payload = {"input": INPUT_AUDIO, "reference": REFERENCE, "asr_mode": "full", "use_cache": False}
+            status, job = request(connect, "POST", "/jobs", payload)
+            assert status == 202 and request(connect, "POST", "/jobs", payload)[0] == 503
+            service.start(warmup=False)
+            status, events = request(connect, "GET", job["events"])
+            assert events[-1]["status"] == "done", events[-1]
+            print("✅ Ошибки параметров и переполнение очереди обрабатываются")
+        finally:
+            stop(server, service)
+
+
+def test_embeddings_keyed_by_encoder():
+    # эмбеддинг заглушки не выдаётся другому кодировщику — и наоборот
+    class OtherEncoder:
+        pass
+
+    store = embedding_store._default_store
+    key, embed = store.get_or_compute(REFERENCE, get_voice_encoder())
+    stub_version = embedding_store.encoder_version(get_voice_encoder())
+    other_version = embedding_store.encoder_version(OtherEncoder())
+    assert stub_version != other_version and "StubVoiceEncoder" in stub_version
+    assert store.get(key, stub_version) is not None and store.get(key, other_version) is None
+    try:
+        embedding_store.get_embedding_by_id(key, OtherEncoder())
+        raise AssertionError("ожидался KeyError")
+    except KeyError:
+        pass
+    print("✅ Эмбеддинги разных кодировщиков хранятся раздельно")
+
+
+def test_unix_socket():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, service, connect = start(tmp, socket_path=str(Path(tmp) / "server.sock"))
+        try:
+            status, job = request(connect, "POST", "/jobs", {"input": INPUT_AUDIO, "reference": REFERENCE,
+                                                             "asr_mode": "full", "use_cache": False})
+            assert status == 202
+            status, events = request(connect, "GET", job["events"])
+            assert events[-1]["status"] == "done", events[-1]
+            print("✅ Unix-сокет работает")
+        finally:
+            stop(server, service)
+
+
+if __name__ == "__main__":
+    setup_module()
+    try:
+        test_job_lifecycle()
+        test_errors_and_queue_limit()
+        test_embeddings_keyed_by_encoder()
+        test_unix_socket()
+    finally:
+        teardown_module()
@@ -0,0 +1,139 @@
+# tests/test_quantization.py
+"""
+Проверка точности режима int8 против fp32 на CPU.
+
+    python tests/test_quantization.py --dataset tests/data/cv-corpus-21.0-delta-2025-03-14/ru
+
+ASR: WER Whisper на выборке Common Voice (харнесс tests/test_asr.py).
+Разделение: сходство очищенной записи с эталоном (compute_similarity из
+tests/test_speaker_extraction.py) после пайплайна до склейки включительно.
+Завершается с кодом 1, если int8 хуже fp32 больше допуска.
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import argparse
+import json
+import os
+import time
+import warnings
+
+from models import registry
+from models.quantization import model_precision
+from run_pipeline import STAGE_NAMES, main
+
+REFERENCE = "tests/data/audio/reference/ali_imba_drink.wav"
+AUDIO_DIR = Path("tests/data/audio/ali")
+OUTPUT_DIR = Path("tests/data/output/test_quantization")
+
+WER_TOLERANCE = 0.03          # абсолютный прирост WER
+SIMILARITY_TOLERANCE = 0.02   # абсолютное падение сходства с эталоном
+
+
+def check_asr(samples, model_size="small"):
+    """
+    :return: {"fp32": {"wer", "seconds"}, "int8": {...}}
+    """
+    from test_asr import evaluate_wer
+
+    results = {}
+    for precision in ("fp32", "int8"):
+        model = registry.get_whisper(model_size, device="cpu", precision=precision)
+        assert model_precision(model) == precision, f"Whisper загружен не в {precision}"
+        t0 = time.time()
+        results[precision] = {"wer": evaluate_wer(model, samples)}
+        results[precision]["seconds"] = time.time() - t0
+        print(f"🔠 Whisper {model_size} {precision}: WER {results[precision]['wer']:.3f}, "
+              f"{results[precision]['seconds']:.1f} сек")
+    return results
+
+
+def check_separation(reference, files):
+    """
+    Прогоняет записи до склейки с Sepformer в fp32 и int8.
+
+    :return: {"fp32": {"similarity": {файл: сходство}, "seconds"}, "int8": {...}}
+    """
+    from test_speaker_extraction import compute_similarity
+
+    results = {}
+    previous = {var: os.environ.get(var) for var in ("SPEECH_ANREC_PRECISION", "SPEECH_ANREC_DEVICE")}
+    # int8 есть только на cpu: на машине с CUDA пайплайн иначе взял бы fp32-модели на GPU
+    os.environ["SPEECH_ANREC_DEVICE"] = "cpu"
+    try:
+        for precision in ("fp32", "int8"):
+            os.environ["SPEECH_ANREC_PRECISION"] = precision
+            assert model_precision(registry.get_sepformer().mods.masknet) == precision
+            similarity, seconds = {}, 0.0
+            for audio_path in files:
+                result = main(audio_path, reference, OUTPUT_DIR / precision, name=Path(audio_path).stem,
+                              save_audio=True, use_cache=False, stages="diarization,separation,combine")
+                similarity[Path(audio_path).name] = float(compute_similarity(reference, result["cleaned_audio"]))
+                seconds += result["timings"][STAGE_NAMES["separation"]]
+            results[precision] = {"similarity": similarity, "seconds": seconds}
+            mean = sum(similarity.values()) / len(similarity)
+            print(f"🎧 Sepformer {precision}: сходство с эталоном {mean:.3f}, разделение {seconds:.1f} сек")
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+    return results
+
+
+def report(asr, separation, wer_tolerance=WER_TOLERANCE, similarity_tolerance=SIMILARITY_TOLERANCE):
+    """
+    Печатает сводку и ускорение.
+
+    :return: список проверок, не уложившихся в допуск
+    """
+    failures = []
+    print("\n📊 int8 против fp32:")
+    if asr:
+        delta = asr["int8"]["wer"] - asr["fp32"]["wer"]
+        speedup = asr["fp32"]["seconds"] / max(asr["int8"]["seconds"], 1e-9)
+        mark = "✅" if delta <= wer_tolerance else "❌"
+        print(f"{mark} ASR: WER {asr['fp32']['wer']:.3f} → {asr['int8']['wer']:.3f} ({delta:+.3f}, "
+              f"допуск {wer_tolerance}), ускорение ×{speedup:.2f}")
+        if delta > wer_tolerance:
+            failures.append("asr")
+    if separation:
+        speedup = separation["fp32"]["seconds"] / max(separation["int8"]["seconds"], 1e-9)
+        print(f"• разделение: ускорение ×{speedup:.2f}")
+        for name, before in separation["fp32"]["similarity"].items():
+            after = separation["int8"]["similarity"][name]
+            mark = "✅" if before - after <= similarity_tolerance else "❌"
+            print(f"{mark} {name}: сходство {before:.3f} → {after:.3f} ({after - before:+.3f})")
+            if before - after > similarity_tolerance:
+                failures.append(f"separation:{name}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="int8 vs fp32 accuracy check")
+    parser.add_argument("--dataset", type=Path, help="Common Voice language directory (validated.tsv, clips/); "
+                                                     "without it the ASR check is skipped")
+    parser.add_argument("--n-samples", type=int, default=20)
+    parser.add_argument("--whisper-size", default="small")
+    parser.add_argument("--reference", default=REFERENCE)
+    parser.add_argument("--audio-dir", type=Path, default=AUDIO_DIR)
+    parser.add_argument("--wer-tolerance", type=float, default=WER_TOLERANCE)
+    parser.add_argument("--similarity-tolerance", type=float, default=SIMILARITY_TOLERANCE)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    asr = None
+    if args.dataset:
+        from test_asr import load_samples
+        asr = check_asr(load_samples(args.dataset, args.n_samples), args.whisper_size)
+    separation = check_separation(args.reference, sorted(args.audio_dir.glob("*.wav")))
+
+    failures = report(asr, separation, args.wer_tolerance, args.similarity_tolerance)
+    with open(OUTPUT_DIR / "results.json", "w", encoding="utf-8") as f:
+        json.dump({"asr": asr, "separation": separation, "failures": failures}, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failures else 0)
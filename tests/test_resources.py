@@ -0,0 +1,90 @@
+# tests/test_resources.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from models import resources
+from models.resources import plan_resources, stage_threads
+
+CORES = list(range(16))
+
+
+def test_plan_modes():
+    plan = plan_resources(1, cores=CORES)
+    assert (plan.mode, plan.workers, plan.threads) == ("latency", 1, 16)
+
+    plan = plan_resources(100, cores=CORES)
+    assert (plan.mode, plan.workers, plan.threads) == ("throughput", 8, 2)
+    assert plan.core_sets[0] == [0, 1] and plan.core_sets[-1] == [14, 15]
+
+    # три файла — три воркера, ядра делятся между ними без пересечений
+    plan = plan_resources(3, cores=CORES)
+    assert (plan.workers, plan.threads) == (3, 5)
+    assert len({c for cores in plan.core_sets for c in cores}) == 15
+
+    assert plan_resources(100, mode="latency", cores=CORES).workers == 1
+    assert plan_resources(100, max_workers=4, cores=CORES).threads == 4
+    assert plan_resources(100, cores=[0, 1, 2]).mode == "latency"
+
+    # фиксированное число воркеров: режим не учитывается, потоки делятся поровну
+    plan = plan_resources(1, mode="latency", workers=4, cores=CORES)
+    assert (plan.mode, plan.workers, plan.threads) == ("throughput", 4, 4)
+    assert plan_resources(1, workers=32, cores=CORES).core_sets[20] == [4]
+    print("✅ План ресурсов выбирается по числу ядер и заданий")
+
+
+def test_stage_threads():
+    plan = plan_resources(1, cores=CORES[:8])
+    previous_plan, previous_threads = resources.get_plan(), torch.get_num_threads()
+    resources._plan = plan
+    try:
+        with stage_threads("asr"):
+            assert torch.get_num_threads() == 8
+        with stage_threads("reference_embedding"):
+            assert torch.get_num_threads() == 2
+            # параллельная диаризация получает свой, больший бюджет
+            with stage_threads("diarization"):
+                assert torch.get_num_threads() == 8
+        assert torch.get_num_threads() == 8
+    finally:
+        resources._plan = previous_plan
+        torch.set_num_threads(previous_threads)
+    print("✅ Бюджеты потоков этапов применяются")
+
+
+def _worker_state():
+    return sorted(os.sched_getaffinity(0)), torch.get_num_threads()
+
+
+def _init(plan, counter):
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    resources.apply_plan(plan, index)
+
+
+def test_worker_pinning():
+    if not hasattr(os, "sched_setaffinity"):
+        print("⏭️ Привязка к ядрам недоступна на этой платформе")
+        return
+    cores = resources.available_cores()
+    plan = plan_resources(len(cores), mode="throughput", cores=cores)
+    counter = multiprocessing.Value("i", 0)
+    with ProcessPoolExecutor(plan.workers, initializer=_init, initargs=(plan, counter)) as pool:
+        futures = [pool.submit(_worker_state) for _ in range(plan.workers * 4)]
+        states = [future.result() for future in futures]
+    for affinity, threads in states:
+        assert affinity in plan.core_sets and threads == plan.threads
+    print(f"✅ Воркеры привязаны к своим ядрам ({plan.describe()})")
+
+
+if __name__ == "__main__":
+    test_plan_modes()
+    test_stage_threads()
+    test_worker_pinning()
@@ -0,0 +1,62 @@
+# tests/test_segment_table.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import random
+
+from models.diarization import segment_table, split_segment_table
+
+
+def brute_force(turns, step=0.01):
+    """Набор активных спикеров в середине каждого шага сетки."""
+    end = max(e for _, e, _ in turns)
+    grid = []
+    for k in range(int(round(end / step))):
+        t = (k + 0.5) * step
+        grid.append(tuple(sorted({spk for s, e, spk in turns if s <= t < e})))
+    return grid
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(50):
+        turns = []
+        for _ in range(rng.randint(1, 15)):
+            start = rng.randint(0, 500) / 100
+            turns.append((start, start + rng.randint(1, 200) / 100, rng.choice("ABC")))
+        table = segment_table(turns)
+        grid = [()] * len(brute_force(turns))
+        for start, end, speakers in table:
+            for k in range(int(round(start * 100)), int(round(end * 100))):
+                grid[k] = speakers
+        assert grid == brute_force(turns), turns
+        # соседние участки с одинаковым набором спикеров склеены
+        assert all(not (a[1] == b[0] and a[2] == b[2]) for a, b in zip(table, table[1:]))
+
+
+def test_split():
+    turns = [(0.0, 4.0, "A"), (3.0, 6.0, "B"), (5.0, 5.5, "C"), (8.0, 9.0, "A"), (8.5, 9.0, "A")]
+    mono, multi = split_segment_table(segment_table(turns))
+    assert mono == [(0.0, 3.0, "A"), (4.0, 5.0, "B"), (5.5, 6.0, "B"), (8.0, 9.0, "A")], mono
+    assert multi == [(3.0, 4.0, ["A", "B"]), (5.0, 5.5, ["B", "C"])], multi
+
+
+def test_many_turns():
+    # лесенка из 20000 реплик: каждая перекрывает следующую на 0.5 сек — таблица известна заранее
+    n = 20000
+    speaker = lambda k: f"SPEAKER_{k % 10:02d}"
+    turns = [(float(k), k + 1.5, speaker(k)) for k in range(n)]
+    expected = [(0.0, 1.0, (speaker(0),))]
+    for k in range(1, n):
+        expected.append((float(k), k + 0.5, tuple(sorted((speaker(k - 1), speaker(k))))))
+        expected.append((k + 0.5, k + 1.0 if k < n - 1 else k + 1.5, (speaker(k),)))
+    # порядок реплик на входе не важен
+    random.Random(1).shuffle(turns)
+    assert segment_table(turns) == expected
+
+
+if __name__ == "__main__":
+    for test in (test_matches_brute_force, test_split, test_many_turns):
+        test()
+        print(f"✅ {test.__name__}")
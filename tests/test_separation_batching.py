@@ -0,0 +1,112 @@
+# tests/test_separation_batching.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import random
+
+import numpy as np
+import torch
+from resemblyzer import preprocess_wav
+
+from models import separation
+from models.registry import get_voice_encoder
+from models.resample import load_audio
+from models.separation import MAX_PADDING, SEPFORMER_SR, _length_batches, _separate_batch, run_separation
+from tests import stub_backends
+
+SR = 16000
+INPUT_AUDIO = "tests/data/audio/overlapped_ali_vasya.wav"
+TOLERANCE = 0.06  # относительная ошибка потока при дополнении нулями не больше MAX_PADDING
+
+
+class NormalizingSepformer:
+    """
+    Заглушка, чувствительная к дополнению нулями так же, как GroupNorm Sepformer:
+    потоки нормируются на энергию всего входа, вместе с нулями.
+    """
+
+    def separate_batch(self, mix):
+        scale = mix.pow(2).mean(dim=-1, keepdim=True).clamp_min(1e-12).rsqrt()
+        return torch.stack([mix * scale, 0.1 * torch.roll(mix, 80, dims=-1) * scale], dim=-1)
+
+
+def overlap_lengths(n=40, seed=0):
+    # точные участки перекрытия: от долей секунды до десятков секунд
+    rng = random.Random(seed)
+    return [int(rng.uniform(0.2, 30.0) * SR) for _ in range(n)]
+
+
+def relative_error(a, b):
+    return float(np.linalg.norm(a - b) / np.linalg.norm(b))
+
+
+def test_batches_bound_padding():
+    lengths = overlap_lengths()
+    batches = _length_batches(lengths, batch_size=8)
+    assert sorted(k for batch in batches for k in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 8
+        longest = max(lengths[k] for k in batch)
+        assert all(1 - lengths[k] / longest <= MAX_PADDING for k in batch), [lengths[k] for k in batch]
+
+    assert _length_batches([100] * 5, batch_size=2) == [[0, 1], [2, 3], [4]]
+    assert _length_batches([10, 1000, 11], batch_size=8, max_padding=0.5) == [[0, 2], [1]]
+
+
+def test_batched_matches_single():
+    model = NormalizingSepformer()
+    rng = np.random.default_rng(0)
+    lengths = overlap_lengths()
+    chunks = [rng.standard_normal(n).astype(np.float32) for n in lengths]
+    single = [_separate_batch(model, [chunk], SR)[0] for chunk in chunks]
+
+    for batch in _length_batches(lengths, batch_size=8):
+        streams = _separate_batch(model, [chunks[k] for k in batch], SR)
+        for k, sources in zip(batch, streams):
+            assert sources.shape == single[k].shape
+            assert relative_error(sources[0], single[k][0]) < TOLERANCE, (lengths[k], [lengths[j] for j in batch])
+
+    # без ограничения короткий участок в пачке с длинным разделяется заметно иначе
+    short, long = chunks[int(np.argmin(lengths))], chunks[int(np.argmax(lengths))]
+    mixed = _separate_batch(model, [short, long], SR)[0]
+    assert relative_error(mixed[0], _separate_batch(model, [short], SR)[0][0]) > 1.0
+
+
+def test_mix_chunks_path():
+    # готовая 8 кГц версия (AudioBuffer) даёт ту же форму потоков, что и передискретизация
+    model = NormalizingSepformer()
+    chunk = np.random.default_rng(1).standard_normal(SR).astype(np.float32)
+    mix = chunk[::SR // SEPFORMER_SR].copy()
+    assert _separate_batch(model, [chunk], SR, [mix])[0].shape == (2, len(chunk))
+
+
+def test_bad_stream_is_skipped():
+    # ошибка кодирования одного потока пропускает этот поток, а не всё разделение
+    loaders = stub_backends.install()
+    embed_utterances = separation.embed_utterances
+
+    def fragile(wavs, encoder):
+        if any(len(wav) < SR for wav in wavs):
+            raise ValueError("поток короче секунды")
+        return embed_utterances(wavs, encoder)
+
+    separation.embed_utterances = fragile
+    try:
+        y = load_audio(INPUT_AUDIO, SR)
+        encoder = get_voice_encoder()
+        ref_embed = encoder.embed_utterance(preprocess_wav(y[2 * SR:5 * SR], source_sr=SR))
+        segments = [(2.0, 5.0, ["A", "B"]), (8.0, 8.5, ["A", "B"]), (12.0, 15.0, ["A", "B"])]
+        # max_padding=1 — все сегменты в одной пачке с коротким
+        result = run_separation(y, SR, segments, "A", ref_embed, encoder, max_padding=1.0)
+        assert [(start, end) for _, start, end in result] == [(2.0, 5.0), (12.0, 15.0)], result
+    finally:
+        separation.embed_utterances = embed_utterances
+        stub_backends.restore(loaders)
+
+
+if __name__ == "__main__":
+    for test in (test_batches_bound_padding, test_batched_matches_single, test_mix_chunks_path,
+                 test_bad_stream_is_skipped):
+        test()
+        print(f"✅ {test.__name__}")
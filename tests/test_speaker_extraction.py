@@ -14,6 +14,7 @@ import os
 from models.diarization import run_diarization
 from models.speaker_extraction import extract_target_speaker
 from models.speaker_id import extract_embedding, get_encoder
+from models.embedding_store import get_reference_embedding
 import librosa
 import librosa.display
 import argparse
@@ -89,7 +90,7 @@ def save_segment_list(mono_segments, multi_segments, target_speaker, output_path
                 f.write(f"Overlap\t{start:.2f}\t{end:.2f}\n")
 
 def compute_similarity(reference_path, final_path):
-    ref_embed = extract_embedding(reference_path, encoder)
+    ref_embed = get_reference_embedding(reference_path, encoder)
     ext_embed = extract_embedding(final_path, encoder)
     similarity = 1 - cosine(ref_embed, ext_embed)
     return similarity
@@ -117,13 +118,14 @@ if __name__ == "__main__":
         mono_segments, multi_segments, diarization_result = run_diarization(str(audio_file))
 
         # Извлечение целевого спикера
-        final_audio_path, target_speaker = extract_target_speaker(
+        _, final_audio_path, target_speaker = extract_target_speaker(
             reference_path=REFERENCE_PATH,
             audio_path=str(audio_file),
             mono_segments=mono_segments,
             multi_segments=multi_segments,
             output_dir=current_output_dir,
-            debug=True
+            debug=True,
+            save_audio=True
         )
 
         # Метрики
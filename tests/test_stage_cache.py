@@ -0,0 +1,127 @@
+# tests/test_stage_cache.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from models.checkpoints import StageCache
+
+
+class Counter:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_hits_and_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StageCache(tmp)
+        compute = Counter({"text": "привет"})
+        first, digest = cache.run("asr", "json", compute, audio="a", model="small")
+        again, digest_again = cache.run("asr", "json", compute, audio="a", model="small")
+        assert compute.calls == 1 and first == again and digest == digest_again
+
+        # другой параметр или другой вход — другой ключ
+        cache.run("asr", "json", compute, audio="a", model="medium")
+        cache.run("asr", "json", compute, audio="b", model="small")
+        assert compute.calls == 3
+
+        # выключенный кэш всегда считает и ничего не пишет
+        disabled = StageCache(Path(tmp) / "off", enabled=False)
+        assert disabled.run("asr", "json", compute, audio="a", model="small") == (compute.value, None)
+        assert compute.calls == 4 and not (Path(tmp) / "off").exists()
+
+
+def test_force_stage():
+    with tempfile.TemporaryDirectory() as tmp:
+        StageCache(tmp).run("combine", "npy", Counter(np.zeros(4, dtype=np.float32)), audio="a")
+        compute = Counter(np.ones(4, dtype=np.float32))
+        forced = StageCache(tmp, force=["combine"])
+        value, digest = forced.run("combine", "npy", compute, audio="a")
+        assert compute.calls == 1 and value.sum() == 4
+        # пересчитанный результат заменил старый: следующий запуск без --force-stage берёт его
+        cached, cached_digest = StageCache(tmp).run("combine", "npy", Counter(None), audio="a")
+        assert np.array_equal(cached, value) and cached_digest == digest
+        # --force-stage не задевает остальные этапы
+        other = Counter("текст")
+        StageCache(tmp).run("asr", "txt", other, audio=digest)
+        forced.run("asr", "txt", other, audio=digest)
+        assert other.calls == 1
+
+
+def test_atomic_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StageCache(tmp)
+
+        def broken():
+            # не сериализуется в JSON: запись падает посреди файла
+            return {"ok": 1, "bad": object()}
+
+        try:
+            cache.run("analysis", "json", broken, transcript="t")
+            raise AssertionError("ожидалась ошибка сериализации")
+        except TypeError:
+            pass
+        assert list(Path(tmp).rglob("*")) == [Path(tmp) / "analysis"], list(Path(tmp).rglob("*"))
+
+        # несколько писателей одного ключа: все получают целый файл, временных не остаётся
+        audio = np.random.default_rng(0).standard_normal(200_000).astype(np.float32)
+        results, errors = [], []
+
+        def write():
+            try:
+                results.append(cache.run("combine", "npy", lambda: (time.sleep(0.05), audio)[1], audio="x"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert len({digest for _, digest in results}) == 1
+        assert [p.name for p in (Path(tmp) / "combine").iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk = np.zeros(25_000, dtype=np.float32)  # ~100 КБ на артефакт
+        cache = StageCache(tmp, max_bytes=350_000)
+        for name in "abcd":
+            cache.run("combine", "npy", Counter(chunk), audio=name)
+            time.sleep(0.01)  # разные mtime
+        cache.run("combine", "npy", Counter(chunk), audio="a")  # попадание освежает «a»
+        cache.run("combine", "npy", Counter(chunk), audio="e")
+
+        files = list((Path(tmp) / "combine").iterdir())
+        assert sum(p.stat().st_size for p in files) <= 350_000
+        compute = Counter(chunk)
+        for name in "ae":
+            cache.run("combine", "npy", compute, audio=name)
+        assert compute.calls == 0  # недавно использованные остались
+        cache.run("combine", "npy", compute, audio="b")
+        assert compute.calls == 1  # самый давний вытеснен
+
+        # срок жизни: артефакт, не использовавшийся дольше ttl, удаляется при следующей записи
+        short = StageCache(tmp, ttl=60)
+        old = next((Path(tmp) / "combine").iterdir())
+        os.utime(old, (time.time() - 120, time.time() - 120))
+        short.run("asr", "txt", Counter("текст"), audio="z")
+        assert not old.exists()
+
+
+if __name__ == "__main__":
+    for test in (test_hits_and_misses, test_force_stage, test_atomic_write, test_eviction):
+        test()
+        print(f"✅ {test.__name__}")